@@ -1,8 +1,35 @@
+import logging
 import os
 
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 app = Celery("backend")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def warm_up_worker(**kwargs):
+    from django.conf import settings
+
+    if not settings.WARMUP_ON_WORKER_INIT:
+        return
+
+    from core.services.retrieval import retrieval
+
+    log = logging.getLogger(__name__)
+    try:
+        timings = retrieval.warm_up()
+    except Exception as e:
+        log.warning("[warmup] skipped: %s", e)
+        return
+    level = logging.WARNING if timings["total"] > settings.STARTUP_BUDGET_SECONDS else logging.INFO
+    log.log(
+        level,
+        "[warmup] pid=%s %s (budget %.1fs)",
+        os.getpid(),
+        timings,
+        settings.STARTUP_BUDGET_SECONDS,
+    )
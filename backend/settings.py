@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+from boto3.s3.transfer import TransferConfig
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,6 +22,8 @@ load_dotenv()
 BASE_DIR = Path(__file__).resolve().parent.parent
 VDB_DIR = Path(BASE_DIR) / "chroma"
 VDB_DIR.mkdir(exist_ok=True)
+# small reference-set collections live here as memory-mapped NumPy matrices
+NUMPY_VDB_DIR = Path(os.getenv("NUMPY_VDB_DIR", str(BASE_DIR / "vectors")))
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
@@ -29,6 +32,23 @@ CELERY_TASK_TIME_LIMIT = 900
 CELERY_TASK_SOFT_TIME_LIMIT = 600
 CELERY_TASK_ACKS_LATE = True
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 50
+# evaluation stages can be served by separate workers: parsing is CPU-bound while
+# the LLM stages mostly wait on the network and suit a high-concurrency worker
+CELERY_TASK_ROUTES = {
+    "core.tasks.parse_documents_task": {"queue": os.getenv("EVAL_PARSE_QUEUE", "celery")},
+    "core.tasks.retrieve_context_task": {"queue": os.getenv("EVAL_RETRIEVE_QUEUE", "celery")},
+    "core.tasks.eval_cv_task": {"queue": os.getenv("EVAL_LLM_QUEUE", "celery")},
+    "core.tasks.eval_project_task": {"queue": os.getenv("EVAL_LLM_QUEUE", "celery")},
+    "core.tasks.synthesize_task": {"queue": os.getenv("EVAL_LLM_QUEUE", "celery")},
+}
+# with WARMUP_ON_WORKER_INIT, children warm the embedding model in
+# worker_process_init, which must finish within this window
+CELERY_WORKER_PROC_ALIVE_TIMEOUT = 60
+
+# off by default: every prefork child would load its own copy of the model; enable
+# it only for the workers that embed (indexing and retrieval queues)
+WARMUP_ON_WORKER_INIT = os.getenv("WARMUP_ON_WORKER_INIT", "0") == "1"
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "20"))
 
 
 # Quick-start development settings - unsuitable for production
@@ -122,6 +142,24 @@ MEDIA_URL = "/media/"  # biarkan django-storages generate signed URL via .url()
 AWS_S3_FILE_OVERWRITE = False  # file dengan nama sama tidak ditimpa
 AWS_S3_OBJECT_PARAMETERS = {"CacheControl": "max-age=86400"}
 
+# multipart above the threshold; memory per upload stays near chunksize * concurrency
+AWS_S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8")) * 1024 * 1024,
+    multipart_chunksize=int(os.getenv("S3_MULTIPART_CHUNKSIZE_MB", "8")) * 1024 * 1024,
+    max_concurrency=int(os.getenv("S3_MULTIPART_CONCURRENCY", "4")),
+    max_io_queue=int(os.getenv("S3_MULTIPART_CONCURRENCY", "4")) * 2,
+)
+# opened S3 objects are spooled; above this size the spool rolls over to a temp file
+AWS_S3_MAX_MEMORY_SIZE = int(os.getenv("EXTRACT_SPOOL_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# uploads are hashed as they stream in; files above the memory limit spool to disk
+FILE_UPLOAD_HANDLERS = [
+    "core.upload_handlers.HashingUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv("FILE_UPLOAD_MAX_MEMORY_MB", "2")) * 1024 * 1024
+
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
@@ -1,10 +1,23 @@
 from django.contrib import admin
 
-from .models import Candidate, Document, Evaluation, IdempotencyKey, Job, JobStageLog
+from .models import (
+    Candidate,
+    Document,
+    Evaluation,
+    EvaluationBatch,
+    IdempotencyKey,
+    IndexManifestEntry,
+    Job,
+    JobStageLog,
+    ReindexJob,
+)
 
 admin.site.register(Candidate)
 admin.site.register(Document)
 admin.site.register(Evaluation)
+admin.site.register(EvaluationBatch)
 admin.site.register(Job)
 admin.site.register(JobStageLog)
 admin.site.register(IdempotencyKey)
+admin.site.register(IndexManifestEntry)
+admin.site.register(ReindexJob)
@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 import threading
 
@@ -17,6 +18,9 @@ class CoreConfig(AppConfig):
             return
         if os.environ.get("RUN_MAIN") != "true":
             return
+        # only the autoreloaded server process, never a worker it spawned
+        if multiprocessing.parent_process() is not None:
+            return
 
         def _run():
             try:
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from core.services.vectordb import chroma_store, numpy_store, small_prefixes
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy reference-set collections indexed in Chroma into the NumPy store that "
+        "VECTOR_STORE=routed serves them from. The Chroma copy is kept unless --drop-source."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prefix",
+            action="append",
+            help="Collection name prefix to move (default: VECTOR_STORE_SMALL_PREFIXES).",
+        )
+        parser.add_argument(
+            "--drop-source",
+            action="store_true",
+            help="Delete each Chroma collection once it has been copied.",
+        )
+
+    def handle(self, *args, **options):
+        prefixes = tuple(options["prefix"] or small_prefixes())
+        large, small = chroma_store(), numpy_store()
+        moved = 0
+        for name in sorted(large.stats()):
+            if not name.startswith(prefixes):
+                continue
+            if small.has_collection(name):
+                # copied by an earlier run; the NumPy copy is the live one since then
+                if options["drop_source"]:
+                    large.drop(name)
+                    self.stdout.write(f"{name}: already copied, Chroma copy dropped")
+                else:
+                    self.stdout.write(f"{name}: already copied, skipped")
+                continue
+            vectors, payloads = large.export(name)
+            if not payloads:
+                continue
+            # the NumPy store writes a collection atomically, so it is complete here
+            small.upsert(name, vectors, payloads)
+            if options["drop_source"]:
+                large.drop(name)
+            moved += 1
+            self.stdout.write(f"{name}: {len(payloads)} chunks")
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} collections."))
@@ -1,15 +1,49 @@
 from django.core.management.base import BaseCommand
 
-from core.models import Document
-from core.services.retrieval import retrieval
+from core.services.indexing import reindex_collection
 
 
 class Command(BaseCommand):
-    help = "Reindex all documents into in-memory vector store (DEV only)."
-
-    def handle(self, *args, **kwargs):
-        cnt = 0
-        for d in Document.objects.all():
-            retrieval.index_document("references", d.storage_path, d.mime_type, str(d.id))
-            cnt += 1
-        self.stdout.write(self.style.SUCCESS(f"Reindexed {cnt} documents."))
+    help = "Reindex documents whose content, chunker or embedding model changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--collection", default="references")
+        parser.add_argument(
+            "--force", action="store_true", help="Re-embed every document, ignoring the manifest."
+        )
+        parser.add_argument("--workers", type=int, help="Text extraction processes.")
+        parser.add_argument("--embed-batch", type=int, help="Chunks per embedding call.")
+        parser.add_argument("--upsert-batch", type=int, help="Chunks per vector store upsert.")
+        parser.add_argument(
+            "--progress-every", type=int, default=50, help="Print progress every N documents."
+        )
+
+    def handle(self, *args, **options):
+        every = max(1, options["progress_every"])
+        last = [0]
+
+        def progress(stats):
+            done = stats["reindexed"] + stats["unchanged"] + stats["skipped"] + stats["failed"]
+            if done - last[0] >= every:
+                last[0] = done
+                rate = stats["chunks"] / stats["elapsed"] if stats["elapsed"] else 0.0
+                self.stdout.write(
+                    f"{done} documents processed, {stats['chunks']} chunks "
+                    f"({rate:.1f} chunks/s, {stats['elapsed']:.1f}s)"
+                )
+
+        stats = reindex_collection(
+            options["collection"],
+            force=options["force"],
+            workers=options["workers"],
+            embed_batch=options["embed_batch"],
+            upsert_batch=options["upsert_batch"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Reindexed {stats['reindexed']} documents "
+                f"({stats['unchanged']} unchanged, {stats['skipped']} skipped, "
+                f"{stats['failed']} failed, {stats['removed']} removed)."
+            )
+        )
@@ -0,0 +1,46 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.services.embedding_server import EmbeddingServer
+from core.services.embeddings import MODEL_NAME, encode_local, warm_up
+
+
+class Command(BaseCommand):
+    help = "Serve the embedding model over a local socket, micro-batching concurrent requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket", default=os.getenv("EMBEDDING_SOCKET", "/tmp/embeddings.sock")
+        )
+        parser.add_argument(
+            "--max-batch", type=int, default=int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+        )
+        parser.add_argument(
+            "--max-wait-ms", type=float, default=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "10"))
+        )
+
+    def handle(self, *args, **options):
+        seconds = warm_up()
+        self.stdout.write(f"Loaded {MODEL_NAME} in {seconds:.2f}s")
+
+        server = EmbeddingServer(
+            options["socket"],
+            encode_local,
+            max_batch=options["max_batch"],
+            max_wait_ms=options["max_wait_ms"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Embedding service listening on {options['socket']} "
+                f"(max_batch={options['max_batch']}, max_wait_ms={options['max_wait_ms']})"
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if os.path.exists(options["socket"]):
+                os.unlink(options["socket"])
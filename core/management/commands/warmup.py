@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.retrieval import retrieval
+
+
+class Command(BaseCommand):
+    help = "Load the embedding model and vector store, and report timings against the budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--strict", action="store_true", help="Fail when the startup budget is exceeded."
+        )
+
+    def handle(self, *args, **options):
+        timings = retrieval.warm_up()
+        budget = settings.STARTUP_BUDGET_SECONDS
+        for name, seconds in timings.items():
+            self.stdout.write(f"{name:>10}: {seconds:.3f}s")
+
+        if timings["total"] > budget:
+            msg = f"Warm-up took {timings['total']:.2f}s, over the {budget:.1f}s budget."
+            if options["strict"]:
+                raise CommandError(msg)
+            self.stdout.write(self.style.WARNING(msg))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Warm-up took {timings['total']:.2f}s (budget {budget:.1f}s).")
+            )
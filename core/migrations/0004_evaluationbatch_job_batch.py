@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_job_reference_set"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EvaluationBatch",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                ("job_title", models.CharField(max_length=200)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "queued"),
+                            ("processing", "processing"),
+                            ("completed", "completed"),
+                        ],
+                        default="queued",
+                        max_length=12,
+                    ),
+                ),
+                ("context", models.JSONField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "reference_set",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="batches",
+                        to="core.referenceset",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="batch",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="jobs",
+                to="core.evaluationbatch",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_evaluationbatch_job_batch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="referenceset",
+            name="index_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
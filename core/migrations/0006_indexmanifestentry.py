@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_referenceset_index_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndexManifestEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("collection", models.CharField(max_length=120)),
+                ("doc_id", models.CharField(max_length=64)),
+                ("sha256_checksum", models.CharField(default="", max_length=64)),
+                ("chunker_version", models.CharField(default="", max_length=32)),
+                ("embedding_model", models.CharField(default="", max_length=200)),
+                ("chunk_count", models.PositiveIntegerField(default=0)),
+                ("indexed_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "unique_together": {("collection", "doc_id")},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_reindexjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documenttext",
+            name="sha256_checksum",
+            field=models.CharField(blank=True, db_index=True, default="", max_length=64),
+        ),
+    ]
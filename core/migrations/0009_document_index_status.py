@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:33
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # documents uploaded before this migration were indexed inside the request
+    Document = apps.get_model("core", "Document")
+    Document.objects.update(index_status="ready")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_documenttext_sha256_checksum"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="index_error",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="index_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "pending"),
+                    ("indexing", "indexing"),
+                    ("ready", "ready"),
+                    ("failed", "failed"),
+                ],
+                db_index=True,
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
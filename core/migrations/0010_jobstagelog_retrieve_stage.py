@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_document_index_status"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="jobstagelog",
+            name="stage",
+            field=models.CharField(
+                choices=[
+                    ("parse_cv", "parse_cv"),
+                    ("eval_cv", "eval_cv"),
+                    ("parse_report", "parse_report"),
+                    ("retrieve", "retrieve"),
+                    ("eval_project", "eval_project"),
+                    ("synthesize", "synthesize"),
+                ],
+                max_length=20,
+            ),
+        ),
+    ]
@@ -16,6 +16,7 @@ class ReferenceSet(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=200, unique=True)  # e.g., "Backend Engineer - Oct 2025"
     is_active = models.BooleanField(default=True)
+    index_version = models.PositiveIntegerField(default=0)  # bumped whenever a doc is indexed
     created_at = models.DateTimeField(auto_now_add=True)
 
 
@@ -37,6 +38,16 @@ class Document(models.Model):
     ref_set = models.ForeignKey(
         ReferenceSet, null=True, blank=True, on_delete=models.SET_NULL, related_name="documents"
     )
+    INDEX_STATUS = [
+        ("pending", "pending"),
+        ("indexing", "indexing"),
+        ("ready", "ready"),
+        ("failed", "failed"),
+    ]
+    index_status = models.CharField(
+        max_length=20, choices=INDEX_STATUS, default="pending", db_index=True
+    )
+    index_error = models.TextField(blank=True, default="")
 
 
 class DocumentText(models.Model):
@@ -44,6 +55,70 @@ class DocumentText(models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name="texts")
     page_number = models.PositiveIntegerField()
     content = models.TextField()
+    sha256_checksum = models.CharField(max_length=64, blank=True, default="", db_index=True)
+
+
+class EvaluationBatch(models.Model):
+    STATUS = [
+        ("queued", "queued"),
+        ("processing", "processing"),
+        ("completed", "completed"),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    reference_set = models.ForeignKey(
+        ReferenceSet, null=True, blank=True, on_delete=models.SET_NULL, related_name="batches"
+    )
+    job_title = models.CharField(max_length=200)
+    status = models.CharField(max_length=12, choices=STATUS, default="queued")
+    context = models.JSONField(null=True, blank=True)  # shared RAG blocks for every job
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+
+class IndexManifestEntry(models.Model):
+    # what is currently embedded for a document in a vector collection; doc_id is not
+    # a foreign key so entries outlive deleted documents until their chunks are purged
+    collection = models.CharField(max_length=120)
+    doc_id = models.CharField(max_length=64)
+    sha256_checksum = models.CharField(max_length=64, default="")
+    chunker_version = models.CharField(max_length=32, default="")
+    embedding_model = models.CharField(max_length=200, default="")
+    chunk_count = models.PositiveIntegerField(default=0)
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [("collection", "doc_id")]
+
+
+class ReindexJob(models.Model):
+    STATUS = [
+        ("queued", "queued"),
+        ("running", "running"),
+        ("completed", "completed"),
+        ("failed", "failed"),
+        ("cancelled", "cancelled"),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    collection = models.CharField(max_length=120, default="references")
+    force = models.BooleanField(default=False)
+    status = models.CharField(max_length=12, choices=STATUS, default="queued")
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    reindexed = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    removed = models.PositiveIntegerField(default=0)
+    chunks = models.PositiveIntegerField(default=0)
+    docs_per_sec = models.FloatField(default=0.0)
+    errors = models.JSONField(default=list, blank=True)
+    checkpoint = models.CharField(max_length=64, default="", blank=True)  # last doc id fully done
+    cancel_requested = models.BooleanField(default=False)
+    error_message = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
 
 
 class Job(models.Model):
@@ -69,6 +144,9 @@ class Job(models.Model):
     reference_set = models.ForeignKey(
         ReferenceSet, null=True, blank=True, on_delete=models.SET_NULL, related_name="jobs"
     )
+    batch = models.ForeignKey(
+        EvaluationBatch, null=True, blank=True, on_delete=models.SET_NULL, related_name="jobs"
+    )
 
 
 class JobStageLog(models.Model):
@@ -76,6 +154,7 @@ class JobStageLog(models.Model):
         ("parse_cv", "parse_cv"),
         ("eval_cv", "eval_cv"),
         ("parse_report", "parse_report"),
+        ("retrieve", "retrieve"),
         ("eval_project", "eval_project"),
         ("synthesize", "synthesize"),
     ]
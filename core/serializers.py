@@ -5,15 +5,42 @@ from rest_framework import serializers
 from .models import Document
 
 
+def file_checksum(f) -> str:
+    sha = hashlib.sha256()
+    for chunk in f.chunks():
+        sha.update(chunk)
+    return sha.hexdigest()
+
+
+# checksum recorded by HashingUploadHandler while the body streamed in; re-reads
+# the file only when the handler did not run
+def upload_checksum(request, field: str, f) -> str:
+    checksum = getattr(request, "upload_checksums", {}).get(field)
+    return checksum or file_checksum(f)
+
+
+# earliest stored upload with identical bytes, so resubmissions share one storage
+# object, one extracted text and one set of vectors
+def find_duplicate(checksum: str, doc_type: str, **filters) -> Document | None:
+    return (
+        Document.objects.filter(sha256_checksum=checksum, type=doc_type, **filters)
+        .exclude(storage_path="")
+        .order_by("created_at")
+        .first()
+    )
+
+
 class UploadSerializer(serializers.Serializer):
     cv = serializers.FileField(required=True)
     report = serializers.FileField(required=True)
 
-    def _save_doc(self, f, doc_type: str) -> Document:
-        sha = hashlib.sha256()
-        for chunk in f.chunks():
-            sha.update(chunk)
-        checksum = sha.hexdigest()
+    # returns (document, created); created is False when an identical upload exists
+    def _save_doc(self, f, doc_type: str) -> tuple[Document, bool]:
+        checksum = upload_checksum(self.context.get("request"), doc_type, f)
+
+        existing = find_duplicate(checksum, doc_type, ref_set__isnull=True)
+        if existing is not None:
+            return existing, False
 
         d = Document.objects.create(
             type=doc_type,
@@ -22,7 +49,7 @@ class UploadSerializer(serializers.Serializer):
             sha256_checksum=checksum,
             storage_path="",
         )
-        return d
+        return d, True
 
 
 class EvaluateSerializer(serializers.Serializer):
@@ -39,3 +66,29 @@ class EvaluateSerializer(serializers.Serializer):
         attrs["cv_doc"] = cv
         attrs["report_doc"] = rp
         return attrs
+
+
+class BatchItemSerializer(serializers.Serializer):
+    cv_document_id = serializers.UUIDField()
+    report_document_id = serializers.UUIDField()
+
+
+class BatchEvaluateSerializer(serializers.Serializer):
+    job_title = serializers.CharField(max_length=200)
+    reference_set_id = serializers.UUIDField()
+    items = BatchItemSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def validate(self, attrs):
+        cv_ids = {it["cv_document_id"] for it in attrs["items"]}
+        rp_ids = {it["report_document_id"] for it in attrs["items"]}
+        cvs = Document.objects.filter(id__in=cv_ids, type="cv").in_bulk()
+        rps = Document.objects.filter(id__in=rp_ids, type="report").in_bulk()
+        missing = [str(i) for i in cv_ids - cvs.keys()] + [str(i) for i in rp_ids - rps.keys()]
+        if missing:
+            raise serializers.ValidationError(
+                {"items": f"Documents not found or type mismatch: {', '.join(missing[:20])}"}
+            )
+        attrs["pairs"] = [
+            (cvs[it["cv_document_id"]], rps[it["report_document_id"]]) for it in attrs["items"]
+        ]
+        return attrs
@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+
+class LocalLRUCache:
+    def __init__(self, max_entries: int = 1024, ttl: float | None = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        expires_at = time.time() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    def __init__(self, path: str, max_entries: int = 10000, ttl: float | None = None):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite handles must not cross a fork
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed_at)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Any | None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at and expires_at < now:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else 0.0
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at, now),
+            )
+            conn.execute("DELETE FROM cache WHERE expires_at > 0 AND expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache")
+            conn.commit()
+
+
+# size is bounded by TTL and Redis' own maxmemory policy; the local LRU only
+# stands in while Redis is unreachable
+class RedisCache:
+    def __init__(
+        self,
+        url: str,
+        prefix: str,
+        max_entries: int = 1024,
+        ttl: float | None = None,
+    ):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local = LocalLRUCache(max_entries=max_entries, ttl=ttl)
+        try:
+            import redis
+
+            self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        except Exception as e:
+            log.warning("[cache] redis unavailable (%s); using local cache only", e)
+            self.client = None
+
+    def _k(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: str) -> Any | None:
+        if self.client is not None:
+            try:
+                raw = self.client.get(self._k(key))
+                return json.loads(raw) if raw is not None else None
+            except Exception as e:
+                log.warning("[cache] redis get failed: %s", e)
+        return self.local.get(key)
+
+    def set(self, key: str, value: Any):
+        if self.client is not None:
+            try:
+                ex = int(self.ttl) if self.ttl else None
+                self.client.set(self._k(key), json.dumps(value, ensure_ascii=False), ex=ex)
+                return
+            except Exception as e:
+                log.warning("[cache] redis set failed: %s", e)
+        self.local.set(key, value)
+
+    def clear(self):
+        self.local.clear()
+        if self.client is not None:
+            try:
+                for k in self.client.scan_iter(f"{self.prefix}:*"):
+                    self.client.delete(k)
+            except Exception as e:
+                log.warning("[cache] redis clear failed: %s", e)
+
+
+# configured from <NAME>_CACHE_BACKEND / _TTL / _MAX_ENTRIES / _PATH / _REDIS_URL;
+# returns None when the backend is "none"
+def build_cache(name: str, default_backend: str = "memory"):
+    env = name.upper()
+    backend = os.getenv(f"{env}_CACHE_BACKEND", default_backend).lower()
+    ttl = float(os.getenv(f"{env}_CACHE_TTL", "0")) or None
+    max_entries = int(os.getenv(f"{env}_CACHE_MAX_ENTRIES", "1024"))
+
+    if backend in ("", "none", "off", "0"):
+        return None
+    if backend == "sqlite":
+        path = os.getenv(f"{env}_CACHE_PATH", f"{name.lower()}_cache.sqlite3")
+        return SQLiteCache(path, max_entries=max_entries, ttl=ttl)
+    if backend == "redis":
+        url = os.getenv(
+            f"{env}_CACHE_REDIS_URL", os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+        )
+        return RedisCache(url, prefix=name.lower(), max_entries=max_entries, ttl=ttl)
+    return LocalLRUCache(max_entries=max_entries, ttl=ttl)
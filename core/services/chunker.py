@@ -1,11 +1,77 @@
-from typing import Dict, List  # noqa: UP035
+import os
+import re
+from collections.abc import Iterator
 
+MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "180"))
+OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))
 
-def simple_chunk(text: str, max_chars: int = 800) -> List[Dict]:  # noqa: UP006
-    chunks = []
-    i = 0
-    while i < len(text):
-        chunk = text[i : i + max_chars]
-        chunks.append({"text": chunk, "meta": {"offset": i}})
-        i += max_chars
-    return chunks
+# bump whenever chunk boundaries change so the reindex manifest re-embeds documents
+CHUNKER_VERSION = f"sent-v2-{MAX_TOKENS}-{OVERLAP_TOKENS}"
+
+# words and punctuation marks; a cheap stand-in for the embedder's wordpiece count
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH = re.compile(r"\S(?:.*?\S)?(?=\s*\n\s*\n|\s*\Z)", re.S)
+# a sentence also ends at a line break or before an inline bullet, so CV bullet
+# lists without full stops split per item. The lookbehinds keep those lookaheads
+# from rescanning a whitespace run at every position inside it
+_SENTENCE = re.compile(
+    r"\S.*?(?:[.!?]+[\"')\]]*(?=\s)|(?<=\S)(?=[ \t]*\n)|(?<=\S)(?=\s+[•●▪◦■]\s)|\Z)", re.S
+)
+
+
+def count_tokens(text: str) -> int:
+    return len(_TOKEN.findall(text))
+
+
+def _units(text: str, max_tokens: int, overlap_tokens: int) -> Iterator[tuple[int, int, int, bool]]:
+    # (start, end, tokens, starts_paragraph) spans of sentences; sentences over the
+    # budget are cut into windows at token boundaries that overlap like chunks do
+    step = max_tokens - overlap_tokens
+    for para in _PARAGRAPH.finditer(text):
+        first = True
+        for sent in _SENTENCE.finditer(text, para.start(), para.end()):
+            tokens = list(_TOKEN.finditer(text, sent.start(), sent.end()))
+            if len(tokens) <= max_tokens:
+                yield sent.start(), sent.end(), len(tokens), first
+            else:
+                for i in range(0, len(tokens), step):
+                    window = tokens[i : i + max_tokens]
+                    yield window[0].start(), window[-1].end(), len(window), first and i == 0
+                    if i + max_tokens >= len(tokens):
+                        break
+            first = False
+
+
+def iter_chunks(
+    text: str, max_tokens: int = MAX_TOKENS, overlap_tokens: int = OVERLAP_TOKENS
+) -> Iterator[dict]:
+    max_tokens = max(1, max_tokens)
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    current: list[tuple[int, int, int, bool]] = []
+    size = 0
+
+    def emit():
+        start, end = current[0][0], current[-1][1]
+        return {"text": text[start:end], "meta": {"offset": start, "tokens": size}}
+
+    for unit in _units(text, max_tokens, overlap_tokens):
+        _, _, tokens, new_paragraph = unit
+        # prefer closing a chunk at a paragraph break once it is half full
+        full = size + tokens > max_tokens
+        if current and (full or (new_paragraph and size >= max_tokens // 2)):
+            yield emit()
+            carried: list[tuple[int, int, int, bool]] = []
+            carried_size = 0
+            for prev in reversed(current):
+                if carried_size + prev[2] > overlap_tokens:
+                    break
+                carried.insert(0, prev)
+                carried_size += prev[2]
+            if carried_size + tokens > max_tokens:
+                carried, carried_size = [], 0
+            current, size = carried, carried_size
+        current.append(unit)
+        size += tokens
+
+    if current:
+        yield emit()
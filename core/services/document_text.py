@@ -0,0 +1,96 @@
+import hashlib
+import logging
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from ..models import Document, DocumentText
+from .retrieval import retrieval
+from .text_extractor import join_pages
+
+log = logging.getLogger(__name__)
+
+
+class IncompleteExtraction(Exception):
+    pass
+
+
+def describe_failures(failed: dict[int, str]) -> str:
+    first = "; ".join(f"page {i + 1}: {reason}" for i, reason in sorted(failed.items())[:3])
+    return f"{len(failed)} page(s) could not be extracted ({first})"
+
+
+def document_checksum(doc: Document) -> str:
+    # older reference uploads were stored without a checksum; hash them once and backfill
+    if doc.sha256_checksum:
+        return doc.sha256_checksum
+    sha = hashlib.sha256()
+    with default_storage.open(doc.storage_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    doc.sha256_checksum = sha.hexdigest()
+    Document.objects.filter(id=doc.id).update(sha256_checksum=doc.sha256_checksum)
+    return doc.sha256_checksum
+
+
+# pages extracted earlier for this document or for any upload with identical bytes
+def cached_pages(doc: Document, checksum: str | None = None) -> list[str] | None:
+    rows = list(
+        DocumentText.objects.filter(document_id=doc.id)
+        .order_by("page_number")
+        .values_list("content", flat=True)
+    )
+    if rows:
+        return rows
+    checksum = checksum or doc.sha256_checksum
+    if not checksum:
+        return None
+    source = (
+        DocumentText.objects.filter(sha256_checksum=checksum)
+        .values_list("document_id", flat=True)
+        .first()
+    )
+    if source is None:
+        return None
+    return list(
+        DocumentText.objects.filter(document_id=source)
+        .order_by("page_number")
+        .values_list("content", flat=True)
+    )
+
+
+def store_pages(doc: Document, pages: list[str], checksum: str | None = None):
+    checksum = checksum or doc.sha256_checksum or ""
+    with transaction.atomic():
+        DocumentText.objects.filter(document_id=doc.id).delete()
+        DocumentText.objects.bulk_create(
+            [
+                DocumentText(
+                    document_id=doc.id,
+                    page_number=i + 1,
+                    content=content,
+                    sha256_checksum=checksum,
+                )
+                for i, content in enumerate(pages)
+            ]
+        )
+
+
+# pages that failed to extract come back empty and are recorded in `failed`; such a
+# partial extraction is not stored, so the next call extracts the document again
+def get_document_pages(doc: Document, failed: dict[int, str] | None = None) -> list[str]:
+    pages = cached_pages(doc)
+    if pages is not None:
+        return pages
+    failed = {} if failed is None else failed
+    pages = retrieval._read_pages(doc.storage_path, doc.mime_type, failed)
+    if failed:
+        log.warning("[document_text] %s: %s", doc.id, describe_failures(failed))
+    # an empty list means the file could not be read; retry on the next call
+    elif pages:
+        store_pages(doc, pages)
+    return pages
+
+
+def get_document_text(doc: Document, failed: dict[int, str] | None = None) -> str:
+    return join_pages(get_document_pages(doc, failed))
@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">I")
+
+
+def send_frame(sock: socket.socket, obj: dict):
+    body = json.dumps(obj).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        part = sock.recv(n - len(buf))
+        if not part:
+            raise ConnectionError("embedding socket closed")
+        buf.extend(part)
+    return bytes(buf)
+
+
+def recv_frame(sock: socket.socket) -> dict:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+class EmbeddingServiceClient:
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _call(self, req: dict) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            send_frame(sock, req)
+            res = recv_frame(sock)
+        if "error" in res:
+            raise RuntimeError(f"embedding service error: {res['error']}")
+        return res
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._call({"op": "embed", "texts": texts})["vectors"]
+
+    def ping(self) -> dict:
+        return self._call({"op": "ping"})
+
+
+class _Pending:
+    __slots__ = ("texts", "vectors", "error", "done")
+
+    def __init__(self, texts: list[str]):
+        self.texts = texts
+        self.vectors: list[list[float]] | None = None
+        self.error: str | None = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    # coalesces concurrent requests into one encode call; a batch is flushed when it
+    # reaches max_batch texts or max_wait_ms after its first request arrived
+    def __init__(self, encode, max_batch: int = 64, max_wait_ms: float = 10.0):
+        self.encode = encode
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.queue: queue.Queue[_Pending] = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list[str]) -> list[list[float]]:
+        item = _Pending(texts)
+        self.queue.put(item)
+        item.done.wait()
+        if item.error is not None:
+            raise RuntimeError(item.error)
+        return item.vectors  # type: ignore
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item.texts)
+            self._flush(batch)
+
+    def _flush(self, batch: list[_Pending]):
+        texts = [t for item in batch for t in item.texts]
+        try:
+            vectors = self.encode(texts)
+        except Exception as e:
+            for item in batch:
+                item.error = str(e)
+                item.done.set()
+            return
+        self.batches += 1
+        self.texts += len(texts)
+        i = 0
+        for item in batch:
+            item.vectors = vectors[i : i + len(item.texts)]
+            i += len(item.texts)
+            item.done.set()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        batcher: MicroBatcher = self.server.batcher  # type: ignore[attr-defined]
+        try:
+            req = recv_frame(self.request)
+            op = req.get("op")
+            if op == "embed":
+                res = {"vectors": batcher.submit(list(req.get("texts") or []))}
+            elif op == "ping":
+                res = {"ok": True, "batches": batcher.batches, "texts": batcher.texts}
+            else:
+                res = {"error": f"unknown op {op!r}"}
+        except ConnectionError:
+            return
+        except Exception as e:
+            res = {"error": str(e)}
+        send_frame(self.request, res)
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, encode, max_batch: int = 64, max_wait_ms: float = 10.0):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        self.batcher = MicroBatcher(encode, max_batch=max_batch, max_wait_ms=max_wait_ms)
@@ -1,19 +1,82 @@
-try:
-    from sentence_transformers import SentenceTransformer
+import logging
+import os
+import threading
+import time
 
-    _MODEL = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-except Exception as e:
-    _MODEL = None
-    _ERR = e
+log = logging.getLogger(__name__)
 
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
-class STEmbedder:
-    def __init__(self):
+# loaded on first use (or by warm_up) so imports, migrations and management
+# commands that never embed don't pay for the model
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+_LOAD_SECONDS: float | None = None
+
+
+def get_model():
+    global _MODEL, _LOAD_SECONDS
+    if _MODEL is not None:
+        return _MODEL
+    with _MODEL_LOCK:
         if _MODEL is None:
-            raise RuntimeError(f"SentenceTransformer not available: {_ERR}")
+            try:
+                from sentence_transformers import SentenceTransformer
+            except Exception as e:
+                raise RuntimeError(f"SentenceTransformer not available: {e}") from e
+            started = time.perf_counter()
+            _MODEL = SentenceTransformer(MODEL_NAME)
+            _LOAD_SECONDS = time.perf_counter() - started
+            log.info("[embeddings] loaded %s in %.2fs", MODEL_NAME, _LOAD_SECONDS)
+    return _MODEL
+
+
+def warm_up() -> float:
+    started = time.perf_counter()
+    get_model().encode(["warm up"], normalize_embeddings=True)
+    return time.perf_counter() - started
+
+
+def encode_local(texts: list[str]) -> list[list[float]]:
+    return get_model().encode(texts, normalize_embeddings=True).tolist()
+
+
+class STEmbedder:
+    # talks to the embedding sidecar when EMBEDDING_SOCKET is set, falling back to
+    # an in-process model if the sidecar is unreachable (EMBEDDING_SERVICE_FALLBACK)
+    def __init__(self, socket_path: str | None = None):
+        self.socket_path = (
+            socket_path if socket_path is not None else os.getenv("EMBEDDING_SOCKET", "")
+        )
+        self.fallback = os.getenv("EMBEDDING_SERVICE_FALLBACK", "1") == "1"
+        self._client = None
+        if self.socket_path:
+            from .embedding_server import EmbeddingServiceClient
+
+            timeout = float(os.getenv("EMBEDDING_SERVICE_TIMEOUT", "30"))
+            self._client = EmbeddingServiceClient(self.socket_path, timeout=timeout)
 
     def embed(self, texts: list[str]) -> list[list[float]]:
-        return _MODEL.encode(texts, normalize_embeddings=True).tolist()  # type: ignore
+        if self._client is not None:
+            try:
+                return self._client.embed(texts)
+            except OSError as e:
+                if not self.fallback:
+                    raise
+                log.warning("[embeddings] sidecar %s unavailable: %s", self.socket_path, e)
+        return encode_local(texts)
 
     def embed_query(self, text: str) -> list[float]:
-        return _MODEL.encode([text], normalize_embeddings=True)[0].tolist()  # type: ignore
+        return self.embed([text])[0]
+
+    def warm_up(self) -> float:
+        if self._client is not None:
+            started = time.perf_counter()
+            try:
+                self._client.ping()
+                return time.perf_counter() - started
+            except OSError as e:
+                if not self.fallback:
+                    raise
+                log.warning("[embeddings] sidecar %s unavailable: %s", self.socket_path, e)
+        return warm_up()
@@ -4,7 +4,6 @@ from typing import Any  # noqa: UP035
 
 from .llm_client import LLMClient
 from .prompts import CV_PROMPT, FINAL_PROMPT, PROJECT_PROMPT
-from .rag import fetch_cv_context, fetch_project_context
 from .schemas import FinalResult, clamp_cv, clamp_project
 
 PROJECT_BUCKETS = {
@@ -21,6 +20,11 @@ PROJECT_BUCKETS = {
     "creativity": (["bonus", "extra", "improve", "enhancement"], 0.10),
 }
 
+CV_KEYS = ("cv_match_rate", "cv_feedback")
+PROJECT_KEYS = ("project_score", "project_feedback")
+FINAL_KEYS = ("overall_summary",)
+_LEN_KEYS = ("job_desc", "cv_rubric", "case_brief", "project_rubric", "cv_hints", "report_hints")
+
 
 def _score_buckets(texts: list[str], buckets: dict[str, tuple[list[str], float]], scale5: bool):
     text = " ".join(texts).lower()
@@ -41,52 +45,75 @@ def _safe_format(tmpl: str, mapping: dict[str, Any]) -> str:
     return tmpl.format_map(d)
 
 
-def run_evaluation(
+# job id and document versions change on every run, so cache keys are built without them
+def _cache_vars(base_vars: dict[str, str]) -> dict[str, str]:
+    return {**base_vars, "job_id": "", "doc_versions": ""}
+
+
+def project_baseline(report_hints: str) -> float:
+    baseline = _score_buckets([report_hints], PROJECT_BUCKETS, scale5=True)
+    return max(1.0, min(5.0, round(baseline, 1)))
+
+
+# prompt variables shared by every LLM stage; plain strings so they can travel
+# between Celery tasks
+def prompt_vars(
     job_title: str,
     cv_hints: str,
     report_hints: str,
-    reference_set_id: str,
+    context: dict[str, str],
     job_id: str = "",
     doc_versions: str = "",
     prior_warnings: str = "",
-):
-    job_desc, cv_rubric = fetch_cv_context(job_title, reference_set_id)
-    case_brief, project_rubric = fetch_project_context(reference_set_id)
-
-    baseline_proj = _score_buckets([report_hints], PROJECT_BUCKETS, scale5=True)
-    baseline_proj = max(1.0, min(5.0, round(baseline_proj, 1)))
-
-    job_desc_short = (job_desc or "").strip()[:400]
-
-    base_vars = {
+) -> dict[str, str]:
+    job_desc = context.get("job_desc", "")
+    return {
         "job_title": job_title,
         "job_id": job_id,
         "doc_versions": doc_versions,
         "prior_warnings": prior_warnings,
         "job_desc": job_desc,
-        "cv_rubric": cv_rubric,
+        "cv_rubric": context.get("cv_rubric", ""),
         "cv_hints": (cv_hints or "(no hints)"),
-        "case_brief": case_brief,
-        "project_rubric": project_rubric,
+        "case_brief": context.get("case_brief", ""),
+        "project_rubric": context.get("project_rubric", ""),
         "report_hints": (report_hints or "(no hints)"),
-        "job_desc_short": job_desc_short,
+        "job_desc_short": (job_desc or "").strip()[:400],
     }
 
-    cv_prompt = _safe_format(CV_PROMPT, base_vars)
-    cv_raw = llm.complete_json(cv_prompt)
+
+def evaluate_cv(base_vars: dict[str, str]) -> dict:
+    cv_raw, cv_meta = llm.complete_json_with_meta(
+        _safe_format(CV_PROMPT, base_vars),
+        required_keys=CV_KEYS,
+        cache_prompt=_safe_format(CV_PROMPT, _cache_vars(base_vars)),
+        validate=clamp_cv,
+    )
     cv_res = clamp_cv(cv_raw)
+    return {
+        "cv_match_rate": float(cv_res.cv_match_rate),
+        "cv_feedback": cv_res.cv_feedback,
+        "cv_json": cv_res.json(),
+        "raw": cv_raw,
+        "meta": cv_meta,
+    }
 
-    proj_prompt = (
-        _safe_format(PROJECT_PROMPT, base_vars)
-        + f"""
+
+def evaluate_project(base_vars: dict[str, str], report_hints: str) -> dict:
+    baseline_proj = project_baseline(report_hints)
+    assistance = f"""
 [Assistance]
 A baseline deterministic score computed from simple keyword buckets is: {baseline_proj}.
 - You MUST NOT return a score lower than this deterministic baseline.
 - If you adjust upward/downward (≤ ±1.0), justify explicitly in 'project_feedback'.
 - Return JSON only.
 """
+    proj_raw, proj_meta = llm.complete_json_with_meta(
+        _safe_format(PROJECT_PROMPT, base_vars) + assistance,
+        required_keys=PROJECT_KEYS,
+        cache_prompt=_safe_format(PROJECT_PROMPT, _cache_vars(base_vars)) + assistance,
+        validate=clamp_project,
     )
-    proj_raw = llm.complete_json(proj_prompt)
     proj_res = clamp_project(proj_raw)
 
     try:
@@ -101,41 +128,49 @@ A baseline deterministic score computed from simple keyword buckets is: {baselin
         ) + " [Adjusted: long report content detected; enforced minimum score 2.5 per policy.]"
     else:
         proj_feedback = proj_res.project_feedback
+    return {
+        "project_score": float(final_proj_score),
+        "project_feedback": proj_feedback,
+        "baseline_proj": baseline_proj,
+        "raw": proj_raw,
+        "meta": proj_meta,
+    }
 
-    final_prompt = _safe_format(
-        FINAL_PROMPT,
-        {
-            **base_vars,
-            "cv_json": cv_res.json(),
-            "project_json": json.dumps(
-                {"project_score": final_proj_score, "project_feedback": proj_feedback},
-                ensure_ascii=False,
-            ),
-        },
+
+def synthesize(base_vars: dict[str, str], cv: dict, project: dict) -> dict:
+    final_vars = {
+        **base_vars,
+        "cv_json": cv["cv_json"],
+        "project_json": json.dumps(
+            {
+                "project_score": project["project_score"],
+                "project_feedback": project["project_feedback"],
+            },
+            ensure_ascii=False,
+        ),
+    }
+    final_raw, final_meta = llm.complete_json_with_meta(
+        _safe_format(FINAL_PROMPT, final_vars),
+        required_keys=FINAL_KEYS,
+        cache_prompt=_safe_format(FINAL_PROMPT, _cache_vars(final_vars)),
+        validate=lambda raw: FinalResult(**raw),
     )
-    final_raw = llm.complete_json(final_prompt)
     final_res = FinalResult(**final_raw)
 
     return {
-        "cv_match_rate": float(cv_res.cv_match_rate),
-        "cv_feedback": cv_res.cv_feedback,
-        "project_score": float(final_proj_score),
-        "project_feedback": proj_feedback,
+        "cv_match_rate": cv["cv_match_rate"],
+        "cv_feedback": cv["cv_feedback"],
+        "project_score": project["project_score"],
+        "project_feedback": project["project_feedback"],
         "overall_summary": final_res.overall_summary,
         "raw_llm": {
-            "cv_raw": cv_raw,
-            "proj_raw": proj_raw,
+            "cv_raw": cv["raw"],
+            "proj_raw": project["raw"],
             "final_raw": final_raw,
         },
         "debug": {
-            "baseline_proj": baseline_proj,
-            "len": {
-                "job_desc": len(job_desc or ""),
-                "cv_rubric": len(cv_rubric or ""),
-                "case_brief": len(case_brief or ""),
-                "project_rubric": len(project_rubric or ""),
-                "cv_hints": len(cv_hints or ""),
-                "report_hints": len(report_hints or ""),
-            },
+            "baseline_proj": project["baseline_proj"],
+            "llm": {"cv": cv["meta"], "project": project["meta"], "final": final_meta},
+            "len": {k: len(base_vars.get(k) or "") for k in _LEN_KEYS},
         },
     }
@@ -0,0 +1,23 @@
+# Entry points for reindex extraction workers. Spawned workers unpickle these by
+# importing this module, so it must not import models before django.setup() runs.
+
+
+def init_worker():
+    import os
+
+    import django
+
+    # workers inherit the runserver environment; without this each one would start
+    # its own startup reindex from CoreConfig.ready()
+    os.environ["AUTO_REINDEX_ON_START"] = "0"
+    os.environ.pop("RUN_MAIN", None)
+    django.setup()
+
+
+# returns the pages and the failure reason per zero-based page that could not be read
+def extract(storage_path: str, mime: str) -> tuple[list[str], dict[int, str]]:
+    from .retrieval import retrieval
+
+    failed: dict[int, str] = {}
+    pages = retrieval._read_pages(storage_path, mime, failed)
+    return pages, failed
@@ -0,0 +1,368 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from ..models import Document, IndexManifestEntry
+from . import index_worker
+from .chunker import CHUNKER_VERSION
+from .document_text import (
+    IncompleteExtraction,
+    cached_pages,
+    describe_failures,
+    document_checksum,
+    get_document_text,
+    store_pages,
+)
+from .embeddings import MODEL_NAME
+from .retrieval import retrieval
+from .text_extractor import join_pages
+
+log = logging.getLogger(__name__)
+
+
+def _is_current(entry: IndexManifestEntry | None, checksum: str) -> bool:
+    return (
+        entry is not None
+        and entry.sha256_checksum == checksum
+        and entry.chunker_version == CHUNKER_VERSION
+        and entry.embedding_model == MODEL_NAME
+    )
+
+
+# the manifest entry goes stale together with the vectors it describes, so a document
+# whose new vectors fail to land is replaced again on the next run instead of looking
+# current; the entry is kept so that run also clears any partially written chunks
+def _drop_vectors(collection: str, doc_id: str):
+    IndexManifestEntry.objects.filter(collection=collection, doc_id=doc_id).update(
+        sha256_checksum=""
+    )
+    retrieval.delete_document(collection, doc_id)
+
+
+# returns the chunk count, or None when the manifest says the document is current
+def index_document(doc: Document, collection: str, force: bool = False) -> int | None:
+    checksum = document_checksum(doc)
+    entry = IndexManifestEntry.objects.filter(collection=collection, doc_id=str(doc.id)).first()
+    if not force and _is_current(entry, checksum):
+        return None
+
+    # a partial extraction is never indexed; the manifest would mark it current
+    failed: dict[int, str] = {}
+    text = get_document_text(doc, failed)
+    if failed:
+        raise IncompleteExtraction(describe_failures(failed))
+
+    if entry is not None:
+        _drop_vectors(collection, str(doc.id))
+    count = retrieval.index_text(collection, text, doc.storage_path, str(doc.id))
+    if count == 0:
+        # unreadable or empty; leave it out of the manifest so the next run retries it
+        IndexManifestEntry.objects.filter(collection=collection, doc_id=str(doc.id)).delete()
+        return count
+    IndexManifestEntry.objects.update_or_create(
+        collection=collection,
+        doc_id=str(doc.id),
+        defaults={
+            "sha256_checksum": checksum,
+            "chunker_version": CHUNKER_VERSION,
+            "embedding_model": MODEL_NAME,
+            "chunk_count": count,
+        },
+    )
+    return count
+
+
+# indexes an upload that duplicates source's bytes by copying source's vectors when
+# they are current, falling back to a regular index from the shared stored text
+def alias_document(doc: Document, collection: str, source: Document, source_collection: str) -> int:
+    checksum = document_checksum(doc)
+    entry = IndexManifestEntry.objects.filter(
+        collection=source_collection, doc_id=str(source.id)
+    ).first()
+    if not _is_current(entry, checksum):
+        return index_document(doc, collection, force=True) or 0
+
+    _drop_vectors(collection, str(doc.id))
+    count = retrieval.copy_document(source_collection, str(source.id), collection, str(doc.id))
+    if count == 0:
+        return index_document(doc, collection, force=True) or 0
+    IndexManifestEntry.objects.update_or_create(
+        collection=collection,
+        doc_id=str(doc.id),
+        defaults={
+            "sha256_checksum": checksum,
+            "chunker_version": CHUNKER_VERSION,
+            "embedding_model": MODEL_NAME,
+            "chunk_count": count,
+        },
+    )
+    return count
+
+
+# reference documents that retrieval for this set would miss right now
+def reference_index_state(refset_id: str) -> dict[str, list[str]]:
+    state: dict[str, list[str]] = {"pending": [], "failed": []}
+    rows = (
+        Document.objects.filter(ref_set_id=refset_id)
+        .exclude(index_status="ready")
+        .values_list("id", "index_status")
+    )
+    for doc_id, index_status in rows:
+        state["failed" if index_status == "failed" else "pending"].append(str(doc_id))
+    return state
+
+
+def purge_vanished(collection: str) -> int:
+    existing = {str(i) for i in Document.objects.values_list("id", flat=True)}
+    removed = 0
+    for entry in IndexManifestEntry.objects.filter(collection=collection):
+        if entry.doc_id in existing:
+            continue
+        retrieval.delete_document(collection, entry.doc_id)
+        entry.delete()
+        removed += 1
+    return removed
+
+
+class BulkIndexer:
+    # Pipelined reindex: text extraction runs in a process pool, chunks from many
+    # documents are embedded in large batches on the calling thread, and a writer
+    # thread upserts them in bulk. Every stage is bounded so memory stays flat.
+    def __init__(
+        self,
+        collection: str = "references",
+        force: bool = False,
+        workers: int | None = None,
+        embed_batch: int | None = None,
+        upsert_batch: int | None = None,
+        queue_size: int | None = None,
+        progress=None,
+        on_document=None,
+    ):
+        self.collection = collection
+        self.force = force
+        self.workers = max(1, workers or int(os.getenv("REINDEX_WORKERS", "4")))
+        self.embed_batch = max(1, embed_batch or int(os.getenv("REINDEX_EMBED_BATCH", "256")))
+        self.upsert_batch = max(1, upsert_batch or int(os.getenv("REINDEX_UPSERT_BATCH", "1024")))
+        self.queue_size = max(1, queue_size or self.workers * 2)
+        self.progress = progress
+        self.on_document = on_document
+
+        self.stats = {
+            "reindexed": 0,
+            "unchanged": 0,
+            "skipped": 0,
+            "failed": 0,
+            "removed": 0,
+            "chunks": 0,
+        }
+        self.errors: list[dict] = []
+        self._started = 0.0
+        self._buffer: list[dict] = []
+        # doc_id -> (doc, checksum, chunk_count) for docs whose chunks are in flight
+        self._inflight_docs: dict[str, tuple[Document, str, int]] = {}
+        self._upserted: Counter[str] = Counter()
+        self._upsert_failed: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _done(self, doc: Document, outcome: str):
+        self.stats[outcome] += 1
+        if self.on_document is not None:
+            self.on_document(str(doc.id), outcome)
+        self._report()
+
+    def _fail(self, doc: Document, error: Exception | str):
+        log.warning("[indexing] %s failed: %s", doc.id, error)
+        self.errors.append(
+            {"doc_id": str(doc.id), "storage_path": doc.storage_path, "error": str(error)[:500]}
+        )
+        self._done(doc, "failed")
+
+    def _report(self):
+        if self.progress is not None:
+            self.progress({**self.stats, "elapsed": round(time.monotonic() - self._started, 2)})
+
+    def _plan(self, docs: Iterable[Document]) -> Iterator[tuple[Document, str, bool]]:
+        entries = {
+            e.doc_id: e for e in IndexManifestEntry.objects.filter(collection=self.collection)
+        }
+        for doc in docs:
+            if not doc.storage_path or doc.storage_path.endswith("/"):
+                self._done(doc, "skipped")
+                continue
+            try:
+                checksum = document_checksum(doc)
+            except Exception as e:
+                self._fail(doc, e)
+                continue
+            entry = entries.get(str(doc.id))
+            if not self.force and _is_current(entry, checksum):
+                self._done(doc, "unchanged")
+                continue
+            yield doc, checksum, entry is not None
+
+    def _executor(self):
+        # Celery prefork children are daemonic and may not have children, so they
+        # extract on threads; spawned workers avoid inheriting sockets and DB handles
+        if self.workers == 1 or multiprocessing.current_process().daemon:
+            return ThreadPoolExecutor(max_workers=self.workers)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=index_worker.init_worker,
+        )
+
+    def _upsert_loop(self, q: queue.Queue):
+        vectors: list[list[float]] = []
+        payloads: list[dict] = []
+
+        def flush():
+            if not payloads:
+                return
+            try:
+                retrieval.vdb.upsert(self.collection, vectors, payloads)
+            except Exception as e:
+                with self._lock:
+                    for p in payloads:
+                        self._upsert_failed[p["doc_id"]] = str(e)
+            else:
+                with self._lock:
+                    self._upserted.update(p["doc_id"] for p in payloads)
+            vectors.clear()
+            payloads.clear()
+
+        while True:
+            item = q.get()
+            if item is None:
+                flush()
+                return
+            for v, p in zip(*item, strict=True):
+                vectors.append(v)
+                payloads.append(p)
+                if len(payloads) >= self.upsert_batch:
+                    flush()
+
+    def _flush_embed(self, q: queue.Queue):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        try:
+            vectors = retrieval.embedder.embed([p["text"] for p in batch])
+        except Exception as e:
+            with self._lock:
+                for p in batch:
+                    self._upsert_failed[p["doc_id"]] = str(e)
+            return
+        q.put((vectors, batch))
+
+    def _accept(self, doc: Document, checksum: str, replace: bool, text: str, q: queue.Queue):
+        if not text.strip():
+            log.warning("[indexing] empty text for %s (%s)", doc.storage_path, doc.mime_type)
+            self._done(doc, "skipped")
+            return
+        if replace:
+            _drop_vectors(self.collection, str(doc.id))
+        payloads = list(retrieval.iter_payloads(text, doc.storage_path, str(doc.id)))
+        if not payloads:
+            self._done(doc, "skipped")
+            return
+        self._inflight_docs[str(doc.id)] = (doc, checksum, len(payloads))
+        self._buffer.extend(payloads)
+        if len(self._buffer) >= self.embed_batch:
+            self._flush_embed(q)
+
+    def _commit_done(self):
+        with self._lock:
+            failed = dict(self._upsert_failed)
+            upserted = dict(self._upserted)
+        for doc_id, (doc, checksum, count) in list(self._inflight_docs.items()):
+            if doc_id in failed:
+                del self._inflight_docs[doc_id]
+                self._fail(doc, failed[doc_id])
+            elif upserted.get(doc_id, 0) >= count:
+                del self._inflight_docs[doc_id]
+                IndexManifestEntry.objects.update_or_create(
+                    collection=self.collection,
+                    doc_id=doc_id,
+                    defaults={
+                        "sha256_checksum": checksum,
+                        "chunker_version": CHUNKER_VERSION,
+                        "embedding_model": MODEL_NAME,
+                        "chunk_count": count,
+                    },
+                )
+                self.stats["chunks"] += count
+                self._done(doc, "reindexed")
+
+    def run(self, docs: Iterable[Document]) -> dict:
+        self._started = time.monotonic()
+        q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        writer = threading.Thread(target=self._upsert_loop, args=(q,), name="reindex-upsert")
+        writer.start()
+        try:
+            with self._executor() as pool:
+                pending: dict = {}
+
+                def drain(block: bool):
+                    done, _ = wait(
+                        pending, timeout=None if block else 0, return_when=FIRST_COMPLETED
+                    )
+                    for fut in done:
+                        doc, checksum, replace = pending.pop(fut)
+                        try:
+                            pages, failed = fut.result()
+                            # partial text is neither stored nor indexed, so the
+                            # next run extracts the document again
+                            if failed:
+                                raise IncompleteExtraction(describe_failures(failed))
+                            if pages:
+                                store_pages(doc, pages, checksum)
+                        except Exception as e:
+                            self._fail(doc, e)
+                            continue
+                        self._accept(doc, checksum, replace, join_pages(pages), q)
+                    self._commit_done()
+
+                for doc, checksum, replace in self._plan(docs):
+                    # text extracted earlier skips the download and the parse entirely
+                    pages = cached_pages(doc, checksum)
+                    if pages is not None:
+                        self._accept(doc, checksum, replace, join_pages(pages), q)
+                        self._commit_done()
+                        continue
+                    while len(pending) >= self.queue_size:
+                        drain(block=True)
+                    pending[pool.submit(index_worker.extract, doc.storage_path, doc.mime_type)] = (
+                        doc,
+                        checksum,
+                        replace,
+                    )
+                    drain(block=False)
+                while pending:
+                    drain(block=True)
+            self._flush_embed(q)
+        finally:
+            q.put(None)
+            writer.join()
+        self._commit_done()
+
+        self.stats["removed"] = purge_vanished(self.collection)
+        self._report()
+        return {**self.stats, "errors": self.errors}
+
+
+def reindex_collection(
+    collection: str = "references", force: bool = False, after: str = "", **options
+) -> dict:
+    docs = Document.objects.order_by("id").only(
+        "id", "storage_path", "mime_type", "sha256_checksum"
+    )
+    if after:
+        docs = docs.filter(id__gt=after)
+    return BulkIndexer(collection, force=force, **options).run(docs.iterator())
@@ -1,7 +1,180 @@
+import hashlib
 import json
 import os
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from .cache import build_cache
+
+try:
+    import h2  # noqa: F401
+    import httpx
+
+    HAS_HTTPX = True
+except Exception:
+    HAS_HTTPX = False
+
+# network failures and HTTP error statuses from either transport; callers retry on these
+RETRYABLE_ERRORS: tuple[type[Exception], ...] = (requests.RequestException,)
+if HAS_HTTPX:
+    RETRYABLE_ERRORS += (httpx.TransportError, httpx.HTTPStatusError)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class _RequestsTransport:
+    def __init__(self, pool_size: int):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Connection"] = "keep-alive"
+
+    def post_json(self, url: str, headers: dict, payload: dict, timeout: tuple[float, float]):
+        response = self.session.post(url, headers=headers, json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def post_stream(self, url: str, headers: dict, payload: dict, timeout: tuple[float, float]):
+        with self.session.post(
+            url, headers=headers, json=payload, timeout=timeout, stream=True
+        ) as response:
+            response.raise_for_status()
+            for raw in response.iter_lines():
+                yield raw.decode("utf-8", errors="replace")
+
+
+class _HttpxTransport:
+    def __init__(self, pool_size: int):
+        limits = httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=60
+        )
+        self.client = httpx.Client(http2=True, limits=limits)
+
+    def post_json(self, url: str, headers: dict, payload: dict, timeout: tuple[float, float]):
+        connect, read = timeout
+        response = self.client.post(
+            url,
+            headers=headers,
+            json=payload,
+            timeout=httpx.Timeout(read, connect=connect),
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def post_stream(self, url: str, headers: dict, payload: dict, timeout: tuple[float, float]):
+        connect, read = timeout
+        with self.client.stream(
+            "POST",
+            url,
+            headers=headers,
+            json=payload,
+            timeout=httpx.Timeout(read, connect=connect),
+        ) as response:
+            response.raise_for_status()
+            yield from response.iter_lines()
+
+
+# one pooled transport per worker process; rebuilt after fork so children never
+# share sockets with their parent
+_transport = None
+_transport_pid: int | None = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    global _transport, _transport_pid
+    pid = os.getpid()
+    if _transport is not None and _transport_pid == pid:
+        return _transport
+    with _transport_lock:
+        if _transport is None or _transport_pid != pid:
+            pool_size = max(1, _env_int("LLM_HTTP_POOL_SIZE", 10))
+            if os.getenv("LLM_HTTP2", "0") == "1" and HAS_HTTPX:
+                _transport = _HttpxTransport(pool_size)
+            else:
+                _transport = _RequestsTransport(pool_size)
+            _transport_pid = pid
+    return _transport
+
+
+class IncrementalJSONObject:
+    # Tracks the first top-level JSON object in a growing text buffer. The object
+    # counts as complete when its closing brace arrives, or earlier once every
+    # required key has a fully parsed value.
+    def __init__(self, required_keys: tuple[str, ...] = ()):
+        self.required_keys = required_keys
+        self.buf = ""
+        self.value: dict | None = None
+        self._start = -1
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> bool:
+        self.buf += text
+        while self._pos < len(self.buf) and self.value is None:
+            ch = self.buf[self._pos]
+            if self._start < 0:
+                if ch == "{":
+                    self._start = self._pos
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._try_parse(self.buf[self._start : self._pos + 1])
+            elif ch == "," and self._depth == 1 and self.required_keys:
+                self._try_parse(self.buf[self._start : self._pos] + "}", partial=True)
+            self._pos += 1
+        return self.value is not None
+
+    def _try_parse(self, candidate: str, partial: bool = False):
+        try:
+            obj = json.loads(candidate)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(obj, dict):
+            return
+        if partial and not all(k in obj for k in self.required_keys):
+            return
+        self.value = obj
+
+
+SYSTEM_PROMPT = "You are a strict evaluator that returns JSON only."
+
+
+def cache_key(model: str, temperature: float, system: str, prompt: str) -> str:
+    raw = json.dumps([model, float(temperature), system, prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
 class LLMClient:
@@ -11,8 +184,48 @@ class LLMClient:
         self.site_url = os.getenv("OPENROUTER_SITE_URL", "")
         self.site_name = os.getenv("OPENROUTER_SITE_NAME", "")
         self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.connect_timeout = _env_float("LLM_CONNECT_TIMEOUT", 5.0)
+        self.read_timeout = _env_float("LLM_READ_TIMEOUT", 60.0)
+        self.stream = os.getenv("LLM_STREAM", "0") == "1"
+        self.cache = build_cache("llm")
+
+    def complete_json_with_meta(
+        self,
+        prompt: str,
+        temperature: float = 0.0,
+        timeout: float | None = None,
+        required_keys: tuple[str, ...] = (),
+        cache_prompt: str | None = None,
+        validate: Callable[[dict], Any] | None = None,
+    ) -> tuple[dict, dict]:
+        started = time.monotonic()
+        # cache_prompt stands in for prompts carrying per-job details that never repeat
+        key = cache_key(
+            self.model, temperature, SYSTEM_PROMPT, prompt if cache_prompt is None else cache_prompt
+        )
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached, {
+                    "cache": "hit",
+                    "key": key[:16],
+                    "latency_ms": round((time.monotonic() - started) * 1000, 1),
+                }
 
-    def complete_json(self, prompt: str, temperature: float = 0.0, timeout: int = 60):
+        meta: dict = {"cache": "miss" if self.cache is not None else "off", "key": key[:16]}
+        if self.stream:
+            result = self._stream_json(prompt, temperature, timeout, required_keys, meta)
+        else:
+            result = self._request_json(prompt, temperature, timeout)
+        # only answers the caller accepts are cached, so a malformed one is asked again
+        if validate is not None:
+            validate(result)
+        if self.cache is not None:
+            self.cache.set(key, result)
+        meta["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return result, meta
+
+    def _headers(self) -> dict:
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -21,25 +234,84 @@ class LLMClient:
             headers["HTTP-Referer"] = self.site_url
         if self.site_name:
             headers["X-Title"] = self.site_name
+        return headers
 
-        payload = {
+    def _payload(self, prompt: str, temperature: float, stream: bool) -> dict:
+        return {
             "model": self.model,
             "messages": [
-                {"role": "system", "content": "You are a strict evaluator that returns JSON only."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
             "temperature": temperature,
-            "stream": False,
+            "stream": stream,
         }
 
-        response = requests.post(self.base_url, headers=headers, json=payload, timeout=timeout)
-        response.raise_for_status()
-        data = response.json()
-        text = data["choices"][0]["message"]["content"]
+    def _timeout(self, timeout: float | None) -> tuple[float, float]:
+        return (self.connect_timeout, timeout if timeout is not None else self.read_timeout)
 
-        # sanitize JSON output
+    def _request_json(self, prompt: str, temperature: float, timeout: float | None):
+        data = get_transport().post_json(
+            self.base_url,
+            self._headers(),
+            self._payload(prompt, temperature, stream=False),
+            timeout=self._timeout(timeout),
+        )
+        return _parse_json_text(data["choices"][0]["message"]["content"])
+
+    def _stream_json(
+        self,
+        prompt: str,
+        temperature: float,
+        timeout: float | None,
+        required_keys: tuple[str, ...],
+        meta: dict,
+    ):
+        started = time.monotonic()
+        parser = IncrementalJSONObject(required_keys)
+        lines = get_transport().post_stream(
+            self.base_url,
+            self._headers(),
+            self._payload(prompt, temperature, stream=True),
+            timeout=self._timeout(timeout),
+        )
+        meta["stream"] = True
+        meta["aborted_early"] = False
         try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            fixed = text.strip().strip("`").lstrip("json").strip()
-            return json.loads(fixed)
+            for line in lines:
+                # SSE: "data: {...}" events, ": comment" keep-alives, "data: [DONE]"
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    event = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                choices = event.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content") or ""
+                if not delta:
+                    continue
+                if "ttft_ms" not in meta:
+                    meta["ttft_ms"] = round((time.monotonic() - started) * 1000, 1)
+                if parser.feed(delta):
+                    meta["aborted_early"] = choices[0].get("finish_reason") is None
+                    break
+        finally:
+            # closing the generator drops the connection, which stops generation upstream
+            lines.close()
+        meta["generation_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+        if parser.value is not None:
+            return parser.value
+        return _parse_json_text(parser.buf)
+
+
+def _parse_json_text(text: str):
+    # sanitize JSON output
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        fixed = text.strip().strip("`").lstrip("json").strip()
+        return json.loads(fixed)
@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+from . import pdf_worker
+
+log = logging.getLogger(__name__)
+
+PAGES_PER_RANGE = max(1, int(os.getenv("PDF_PAGES_PER_RANGE", "16")))
+WORKERS = max(1, int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1)))))
+RANGE_TIMEOUT = float(os.getenv("PDF_RANGE_TIMEOUT", "30"))
+RANGE_MAX_MEMORY_MB = int(os.getenv("PDF_RANGE_MAX_MEMORY_MB", "1024"))
+
+
+def _extract_range(
+    path: str, start: int, end: int
+) -> tuple[dict[int, str], dict[int, str], int | None]:
+    # the child applies its own RLIMIT_AS; preexec_fn is unsafe with threads
+    proc = subprocess.Popen(
+        [sys.executable, pdf_worker.__file__, path, str(start), str(end), str(RANGE_MAX_MEMORY_MB)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    reason = ""
+    try:
+        out, err = proc.communicate(timeout=RANGE_TIMEOUT)
+        if proc.returncode:
+            reason = f"exited with {proc.returncode}: {err.strip()[-300:]}"
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        out, _ = proc.communicate()
+        reason = f"timed out after {RANGE_TIMEOUT:g}s"
+
+    total: int | None = None
+    texts: dict[int, str] = {}
+    failed: dict[int, str] = {}
+    for line in out.splitlines():
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if "pages" in item:
+            total = item["pages"]
+        elif "error" in item:
+            failed[item["page"]] = item["error"]
+        else:
+            texts[item["page"]] = item["text"]
+    # pages the child never reached share the reason it stopped
+    for i in range(start, end if total is None else min(end, total)):
+        if i not in texts and i not in failed:
+            failed[i] = reason or "no output"
+    return texts, failed, total
+
+
+# Splits the PDF into page ranges, each extracted by its own child process with a
+# wall-clock and address-space limit. Pages are yielded in order as their range
+# finishes and at most WORKERS ranges are in flight, so a consumer that stops early
+# also stops the remaining ranges. Failed pages are yielded as "" and their reason
+# is recorded in `failed` by zero-based page number; a document whose page count
+# could not be read yields nothing and is recorded as failed at page 0.
+def extract_pdf_pages(
+    path: str, max_pages: int = 0, failed: dict[int, str] | None = None
+) -> Iterator[str]:
+    failed = {} if failed is None else failed
+    first_end = min(PAGES_PER_RANGE, max_pages) if max_pages else PAGES_PER_RANGE
+    texts, range_failed, total = _extract_range(path, 0, first_end)
+    if total is None:
+        failed[0] = range_failed.get(0, "could not read the page count")
+        log.warning("[pdf] %s: could not be opened: %s", path, failed[0])
+        return
+    if max_pages:
+        total = min(total, max_pages)
+    failed.update(range_failed)
+    try:
+        for i in range(min(first_end, total)):
+            yield texts.get(i, "")
+        del texts
+
+        ranges = iter(
+            [(s, min(s + PAGES_PER_RANGE, total)) for s in range(first_end, total, PAGES_PER_RANGE)]
+        )
+        with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+            inflight: deque = deque()
+
+            def submit():
+                r = next(ranges, None)
+                if r is not None:
+                    inflight.append((r, pool.submit(_extract_range, path, *r)))
+
+            for _ in range(WORKERS):
+                submit()
+            try:
+                while inflight:
+                    (start, end), fut = inflight.popleft()
+                    submit()
+                    range_texts, range_failed, _ = fut.result()
+                    failed.update(range_failed)
+                    for i in range(start, end):
+                        yield range_texts.get(i, "")
+            finally:
+                for _, fut in inflight:
+                    fut.cancel()
+    finally:
+        if failed:
+            first = dict(sorted(failed.items())[:5])
+            log.warning("[pdf] %s: %d of %d pages failed: %s", path, len(failed), total, first)
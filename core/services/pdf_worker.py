@@ -0,0 +1,34 @@
+# Extracts one page range of a PDF in a child process and writes one JSON line per
+# page to stdout as soon as it is done, so a parent that has to kill this process
+# still keeps the pages finished before the timeout. The first line carries the
+# document's page count, so the parent never parses the file itself. Run by path
+# (not with -m) so it imports nothing but pypdf.
+import json
+import sys
+
+from pypdf import PdfReader
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def main(path: str, start: int, end: int, max_memory_mb: int = 0):
+    if resource is not None and max_memory_mb:
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    reader = PdfReader(path)
+    sys.stdout.write(json.dumps({"pages": len(reader.pages)}) + "\n")
+    sys.stdout.flush()
+    for i in range(start, min(end, len(reader.pages))):
+        try:
+            line = {"page": i, "text": reader.pages[i].extract_text() or ""}
+        except Exception as e:
+            line = {"page": i, "error": f"{type(e).__name__}: {e}"[:500]}
+        sys.stdout.write(json.dumps(line) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
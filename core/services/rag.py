@@ -1,36 +1,118 @@
+import hashlib
+import logging
+
+from django.db.models import F
+
+from ..models import ReferenceSet
+from .cache import build_cache
 from .collections import ref_collection
 from .retrieval import retrieval
 
+log = logging.getLogger(__name__)
 
-def fetch_cv_context(job_title: str, reference_set_id: str, top_k=6):
-    col_jd = ref_collection(reference_set_id, "job_desc")
-    col_rub = ref_collection(reference_set_id, "scoring_rubric")
+# assembled context blocks keyed by reference set index_version, so indexing a new
+# reference document invalidates every process's entries at once
+_context_cache = build_cache("rag_context")
 
-    jd_hits = retrieval.search(col_jd, f"{job_title} backend cloud api", top_k=top_k)
-    rub_hits = retrieval.search(col_rub, "cv rubric backend", top_k=top_k)
 
-    print(
-        "[RAG HITS CV]",
-        {"col_jd": col_jd, "jd": len(jd_hits), "col_rub": col_rub, "rub": len(rub_hits)},
+def _refset_version(reference_set_id: str) -> int | None:
+    return (
+        ReferenceSet.objects.filter(id=reference_set_id)
+        .values_list("index_version", flat=True)
+        .first()
     )
 
-    job_desc = "\n---\n".join([h["text"] for h in jd_hits])
-    cv_rubric = "\n---\n".join([h["text"] for h in rub_hits])
-    return job_desc, cv_rubric
 
+def _cached(kind: str, reference_set_id: str, params: str, build):
+    version = _refset_version(reference_set_id) if _context_cache is not None else None
+    if version is None:
+        return build()
+    digest = hashlib.sha256(params.encode("utf-8")).hexdigest()[:16]
+    key = f"{kind}:{reference_set_id}:{version}:{digest}"
+    cached = _context_cache.get(key)  # type: ignore
+    if cached is not None:
+        return cached
+    value = build()
+    _context_cache.set(key, value)  # type: ignore
+    return value
 
-def fetch_project_context(reference_set_id: str, top_k=6):
-    col_cb = ref_collection(reference_set_id, "case_brief")
-    col_rub = ref_collection(reference_set_id, "scoring_rubric")
 
-    cb_hits = retrieval.search(col_cb, "backend case brief rag", top_k=top_k)
-    rub_hits = retrieval.search(col_rub, "project rubric backend", top_k=top_k)
+def invalidate_reference_context(reference_set_id: str):
+    ReferenceSet.objects.filter(id=reference_set_id).update(index_version=F("index_version") + 1)
+
+
+# (context key, document type, query) for every retrieval one evaluation needs
+_PROJECT_PLAN = [
+    ("case_brief", "case_brief", "backend case brief rag"),
+    ("project_rubric", "scoring_rubric", "project rubric backend"),
+]
+
+
+def _job_plan(job_title: str) -> list[tuple[str, str, str]]:
+    return [
+        ("job_desc", "job_desc", f"{job_title} backend cloud api"),
+        ("cv_rubric", "scoring_rubric", "cv rubric backend"),
+        *_PROJECT_PLAN,
+    ]
+
+
+def _chunk_key(collection: str, hit: dict) -> tuple:
+    return collection, hit.get("doc_id"), hit.get("offset")
 
-    print(
-        "[RAG HITS PROJ]",
-        {"col_cb": col_cb, "cb": len(cb_hits), "col_rub": col_rub, "rub": len(rub_hits)},
-    )
 
-    case_brief = "\n---\n".join([h["text"] for h in cb_hits])
-    project_rubric = "\n---\n".join([h["text"] for h in rub_hits])
-    return case_brief, project_rubric
+# a block that shares its collection always keeps this many of its own best hits,
+# even when another block scored them higher
+_MIN_OWN_HITS = 1
+
+
+# A collection that serves several blocks (the rubric feeds both the CV and the
+# project prompt) is over-fetched once per query. Each block first keeps its own top
+# _MIN_OWN_HITS hits; every other chunk goes only to the block whose query scored it
+# highest, so beyond that minimum no chunk is sent to the LLM twice.
+def _run_plan(plan: list[tuple[str, str, str]], reference_set_id: str, top_k: int) -> dict:
+    collections = [ref_collection(reference_set_id, dtype) for _, dtype, _ in plan]
+    shared = {c for c in collections if collections.count(c) > 1}
+    requests = [
+        (c, query, top_k * 2 if c in shared else top_k)
+        for c, (_, _, query) in zip(collections, plan, strict=True)
+    ]
+    results = retrieval.search_many(requests)
+
+    owner: dict[tuple, tuple[float, int]] = {}
+    reserved: dict[tuple, set[int]] = {}
+    for i, (c, hits) in enumerate(zip(collections, results, strict=True)):
+        if c not in shared:
+            continue
+        for rank, h in enumerate(hits):
+            key = _chunk_key(c, h)
+            if rank < _MIN_OWN_HITS:
+                reserved.setdefault(key, set()).add(i)
+            if key not in owner or h["score"] > owner[key][0]:
+                owner[key] = (h["score"], i)
+
+    def keeps(i: int, key: tuple) -> bool:
+        if key in reserved:
+            return i in reserved[key]
+        return owner[key][1] == i
+
+    blocks: dict[str, str] = {}
+    counts: dict[str, int] = {}
+    for i, ((name, _, _), c, hits) in enumerate(zip(plan, collections, results, strict=True)):
+        if c in shared:
+            hits = [h for h in hits if keeps(i, _chunk_key(c, h))]
+        hits = hits[:top_k]
+        blocks[name] = "\n---\n".join(h["text"] for h in hits)
+        counts[name] = len(hits)
+    log.debug("[rag] hits %s", counts)
+    return blocks
+
+
+# every context block of one job: a single batched query embedding and one vector
+# query per collection
+def fetch_job_context(job_title: str, reference_set_id: str, top_k=6) -> dict[str, str]:
+    return _cached(
+        "job",
+        reference_set_id,
+        f"{job_title}|{top_k}",
+        lambda: _run_plan(_job_plan(job_title), reference_set_id, top_k),
+    )
@@ -1,19 +1,31 @@
+import hashlib
 import logging
+import os
+import threading
+import time
+from collections.abc import Iterator
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.utils import timezone
 
-from .chunker import simple_chunk
-from .embeddings import STEmbedder
-from .text_extractor import extract_text_auto
-from .vectordb_chroma import ChromaVectorDB
+from .cache import LocalLRUCache, build_cache
+from .chunker import iter_chunks
+from .embeddings import MODEL_NAME, STEmbedder
+from .text_extractor import extract_pages_auto
+from .vectordb import INCLUDE_ALL
+
+if TYPE_CHECKING:
+    from .vectordb import VectorStore
 
 log = logging.getLogger(__name__)
 
 GLOBAL_EMBEDDER = STEmbedder()
 
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "64"))
+
 
 def _guess_mime(mime: str, storage_path: str) -> str:
     m = (mime or "").lower()
@@ -29,62 +41,204 @@ def _guess_mime(mime: str, storage_path: str) -> str:
     return m or "application/octet-stream"
 
 
+class QueryEmbeddingCache:
+    # per-process LRU of normalized query text -> vector, optionally backed by a
+    # shared cache (QUERY_EMBEDDING_SHARED_CACHE_BACKEND=sqlite|redis)
+    def __init__(self, max_entries: int = 512):
+        self.local = LocalLRUCache(max_entries=max_entries)
+        self.shared = build_cache("query_embedding_shared", default_backend="none")
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        # the MiniLM tokenizer lowercases anyway, so this never changes the vector
+        return " ".join((text or "").split()).lower()
+
+    @staticmethod
+    def _shared_key(norm: str) -> str:
+        return hashlib.sha256(f"{MODEL_NAME}|{norm}".encode()).hexdigest()
+
+    def get(self, norm: str) -> list[float] | None:
+        vec = self.local.get(norm)
+        if vec is not None:
+            with self._lock:
+                self.hits += 1
+            return vec
+        if self.shared is not None:
+            vec = self.shared.get(self._shared_key(norm))
+            if vec is not None:
+                self.local.set(norm, vec)
+                with self._lock:
+                    self.shared_hits += 1
+                return vec
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, norm: str, vec: list[float]):
+        self.local.set(norm, vec)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(norm), vec)
+
+    def stats(self) -> dict:
+        total = self.hits + self.shared_hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.shared_hits) / total, 3) if total else 0.0,
+            "size": len(self.local),
+            "max_entries": self.local.max_entries,
+        }
+
+
 class RetrievalService:
-    def __init__(self, embedder=None, vdb: ChromaVectorDB | None = None):
+    def __init__(self, embedder=None, vdb: "VectorStore | None" = None):
         self.embedder = embedder or GLOBAL_EMBEDDER
-        self.vdb = vdb or ChromaVectorDB(persist_dir=str(settings.VDB_DIR))
-
-    def _read_text(self, storage_path: str, mime: str) -> str:
+        self._vdb = vdb
+        self._vdb_lock = threading.Lock()
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=int(os.getenv("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", "512"))
+        )
+
+    @property
+    def vdb(self) -> "VectorStore":
+        # backends open their stores on creation, so the store is built on first use
+        if self._vdb is None:
+            with self._vdb_lock:
+                if self._vdb is None:
+                    from .vectordb import build_vector_store
+
+                    self._vdb = build_vector_store()
+        return self._vdb
+
+    def warm_up(self) -> dict[str, float]:
+        timings = {}
+        started = time.perf_counter()
+        self.vdb  # noqa: B018
+        timings["vector_db"] = round(time.perf_counter() - started, 3)
+        timings["embedder"] = round(self.embedder.warm_up(), 3)
+        timings["total"] = round(timings["vector_db"] + timings["embedder"], 3)
+        return timings
+
+    # cache misses are encoded together in one batched forward pass
+    def embed_queries(self, queries: list[str]) -> list[list[float]]:
+        norms = [self.query_cache.normalize(q) for q in queries]
+        found = {n: self.query_cache.get(n) for n in dict.fromkeys(norms)}
+        missing = [n for n, v in found.items() if v is None]
+        if missing:
+            for n, qv in zip(missing, self.embedder.embed(missing), strict=True):
+                self.query_cache.set(n, qv)
+                found[n] = qv
+        return [found[n] for n in norms]  # type: ignore
+
+    # pages that could not be extracted come back empty and are recorded in `failed`
+    def _read_pages(
+        self, storage_path: str, mime: str, failed: dict[int, str] | None = None
+    ) -> list[str]:
         m2 = _guess_mime(mime, storage_path)
+        failed = {} if failed is None else failed
 
         try:
             with default_storage.open(storage_path, "rb") as f:
-                return extract_text_auto(f, m2)
+                return extract_pages_auto(f, m2, failed)
         except Exception as e:
             log.warning("[retrieval] default_storage.open failed for %s: %s", storage_path, e)
+            failed.clear()
 
         full_path = Path(settings.MEDIA_ROOT) / storage_path
         if full_path.exists():
-            return extract_text_auto(str(full_path), m2)
+            return extract_pages_auto(str(full_path), m2, failed)
 
         log.error("[retrieval] file not found in storage or local path: %s", storage_path)
-        return ""
+        return []
 
-    def index_document(self, collection: str, storage_path: str, mime: str, doc_id: str) -> int:
-        text = self._read_text(storage_path, mime)
+    def iter_payloads(self, text: str, storage_path: str, doc_id: str) -> Iterator[dict]:
+        now = str(timezone.now())
+        for i, c in enumerate(iter_chunks(text)):
+            yield {
+                "id": f"{doc_id}:{i}",
+                "doc_id": str(doc_id),
+                "offset": int(c.get("meta", {}).get("offset", 0)),
+                "text": c["text"],
+                "ts": now,
+                "storage_path": storage_path,
+            }
+
+    def index_text(self, collection: str, text: str, storage_path: str, doc_id: str) -> int:
         if not text.strip():
-            log.warning("[retrieval] empty text for %s (%s)", storage_path, mime)
+            log.warning("[retrieval] empty text for %s (%s)", storage_path, doc_id)
             return 0
 
-        chunks = simple_chunk(text, max_chars=800)
-        if not chunks:
-            log.warning("[retrieval] no chunks extracted for %s (%s)", storage_path, mime)
-            return 0
-
-        vectors = self.embedder.embed([c["text"] for c in chunks])
-        now = str(timezone.now())
+        # embed and upsert as chunks are produced instead of materializing them all
+        count = 0
+        batch: list[dict] = []
+        for payload in self.iter_payloads(text, storage_path, doc_id):
+            batch.append(payload)
+            if len(batch) >= INDEX_BATCH_SIZE:
+                self._upsert_batch(collection, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self._upsert_batch(collection, batch)
+            count += len(batch)
+
+        if not count:
+            log.warning("[retrieval] no chunks extracted for %s (%s)", storage_path, doc_id)
+        return count
+
+    def _upsert_batch(self, collection: str, payloads: list[dict]):
+        vectors = self.embedder.embed([p["text"] for p in payloads])
+        self.vdb.upsert(collection, vectors, payloads)
 
-        payloads: list[dict] = []
-        for i, c in enumerate(chunks):
-            offset = int(c.get("meta", {}).get("offset", 0))
-            payloads.append(
-                {
-                    "id": f"{doc_id}:{i}",
-                    "doc_id": str(doc_id),
-                    "offset": offset,
-                    "text": c["text"],
-                    "ts": now,
-                    "storage_path": storage_path,
-                }
+    def search(
+        self,
+        collection: str,
+        query: str,
+        top_k: int = 5,
+        include: tuple[str, ...] = INCLUDE_ALL,
+    ) -> list[dict]:
+        return self.search_many([(collection, query, top_k)], include=include)[0]
+
+    # (collection, query, top_k) requests answered with one embedding pass and one
+    # vector query per collection; results come back in request order
+    def search_many(
+        self, requests: list[tuple[str, str, int]], include: tuple[str, ...] = INCLUDE_ALL
+    ) -> list[list[dict]]:
+        qvs = self.embed_queries([query for _, query, _ in requests])
+        by_collection: dict[str, list[int]] = {}
+        for i, (collection, _, _) in enumerate(requests):
+            by_collection.setdefault(collection, []).append(i)
+
+        results: list[list[dict]] = [[] for _ in requests]
+        for collection, idxs in by_collection.items():
+            top_k = max(requests[i][2] for i in idxs)
+            hits = self.vdb.query_many(
+                collection, [qvs[i] for i in idxs], top_k=top_k, include=include
             )
+            for i, qhits in zip(idxs, hits, strict=True):
+                results[i] = [{"score": s, **p} for s, p in qhits[: requests[i][2]]]
+        return results
+
+    # re-keys another document's chunks under doc_id without embedding them again
+    def copy_document(
+        self, src_collection: str, src_doc_id: str, collection: str, doc_id: str
+    ) -> int:
+        vectors, payloads = self.vdb.get_document(src_collection, src_doc_id)
+        for p in payloads:
+            p["id"] = f"{doc_id}:{p['id'].rsplit(':', 1)[-1]}"
+            p["doc_id"] = str(doc_id)
+        for i in range(0, len(payloads), INDEX_BATCH_SIZE):
+            self.vdb.upsert(
+                collection, vectors[i : i + INDEX_BATCH_SIZE], payloads[i : i + INDEX_BATCH_SIZE]
+            )
+        return len(payloads)
 
-        self.vdb.upsert(collection, vectors, payloads)
-        return len(chunks)
-
-    def search(self, collection: str, query: str, top_k: int = 5) -> list[dict]:
-        qv = self.embedder.embed_query(query)
-        hits = self.vdb.query(collection, qv, top_k=top_k)
-        return [{"score": s, **p} for s, p in hits]
+    def delete_document(self, collection: str, doc_id: str):
+        self.vdb.delete_document(collection, doc_id)
 
     def count(self, collection: str) -> int:
         return self.vdb.count(collection)
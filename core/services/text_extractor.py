@@ -1,10 +1,16 @@
-from io import BytesIO
+import io
+import os
+import shutil
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
 from typing import IO, Union
 
-from docx import Document as DocxDocument
 from pypdf import PdfReader
 
+from .pdf_extractor import extract_pdf_pages
+
 try:
     from docx import Document as DocxDocument
 
@@ -15,43 +21,154 @@ except Exception:
 
 FileLike = Union[str, Path, IO[bytes]]  # noqa: UP007
 
+# 0 disables a cap; the character cap applies to the whole document
+MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "0"))
+MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "0"))
+# non-seekable sources are spooled to a temp file once they exceed this size
+SPOOL_MAX_BYTES = int(os.getenv("EXTRACT_SPOOL_MAX_BYTES", str(4 * 1024 * 1024)))
+# extract PDFs in time- and memory-limited child processes, by page range. Small
+# PDFs (at most PDF_ISOLATE_MIN_PAGES pages in a file no larger than
+# PDF_INPROCESS_MAX_BYTES) stay in-process, where a child would cost more than the
+# parse; larger files are never opened in this process at all
+PDF_ISOLATED = os.getenv("PDF_EXTRACT_ISOLATED", "1") == "1"
+PDF_ISOLATE_MIN_PAGES = int(os.getenv("PDF_ISOLATE_MIN_PAGES", "8"))
+PDF_INPROCESS_MAX_BYTES = int(os.getenv("PDF_INPROCESS_MAX_BYTES", str(4 * 1024 * 1024)))
+
 
-def _ensure_bytesio(src: FileLike) -> BytesIO:
+@contextmanager
+def _open_seekable(src: FileLike) -> Iterator[IO[bytes]]:
+    # paths and seekable handles are read in place, so the parsers pull only the
+    # bytes they need instead of a full in-memory copy
     if isinstance(src, (str, Path)):
         with open(src, "rb") as f:
-            return BytesIO(f.read())
-    data = src.read()  # type: ignore[attr-defined]
-    return BytesIO(data)
+            yield f
+        return
+    seekable = getattr(src, "seekable", None)
+    if seekable is not None and seekable():
+        src.seek(0)
+        yield src
+        return
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+        shutil.copyfileobj(src, spool, 1024 * 1024)  # type: ignore[arg-type]
+        spool.seek(0)
+        yield spool  # type: ignore[misc]
 
 
-def extract_text_from_pdf(src: FileLike) -> str:
-    bio = _ensure_bytesio(src)
-    reader = PdfReader(bio)
-    out = []
-    for page in reader.pages:
-        out.append(page.extract_text() or "")
-    return "\n".join(out).strip()
+@contextmanager
+def _as_path(src: FileLike) -> Iterator[str]:
+    if isinstance(src, (str, Path)):
+        yield str(src)
+        return
+    with _open_seekable(src) as f, tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+        shutil.copyfileobj(f, tmp, 1024 * 1024)
+        tmp.flush()
+        yield tmp.name
+
+
+def _capped(pages: Iterator[str], max_pages: int, max_chars: int) -> Iterator[str]:
+    remaining = max_chars
+    try:
+        for i, text in enumerate(pages):
+            if max_pages and i >= max_pages:
+                return
+            if max_chars:
+                text = text[:remaining]
+                remaining -= len(text)
+            yield text
+            if max_chars and remaining <= 0:
+                return
+    finally:
+        # stopping early also stops extraction workers that are still running
+        close = getattr(pages, "close", None)
+        if close is not None:
+            close()
+
+
+def _size(f: IO[bytes]) -> int:
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    return size
+
+
+def _in_process_reader(f: IO[bytes]) -> PdfReader | None:
+    if not PDF_ISOLATED:
+        return PdfReader(f)
+    if _size(f) > PDF_INPROCESS_MAX_BYTES:
+        return None
+    reader = PdfReader(f)
+    return reader if len(reader.pages) <= PDF_ISOLATE_MIN_PAGES else None
+
+
+# yields one entry per page as it is extracted; pages that fail come back as "" with
+# their reason recorded in `failed` by zero-based page number
+def iter_pdf_pages(
+    src: FileLike, max_pages: int = 0, failed: dict[int, str] | None = None
+) -> Iterator[str]:
+    failed = {} if failed is None else failed
+    with _open_seekable(src) as f:
+        try:
+            reader = _in_process_reader(f)
+        except Exception as e:
+            # same outcome as an isolated extraction that cannot read the page count
+            failed[0] = f"{type(e).__name__}: {e}"[:500]
+            return
+        if reader is not None:
+            total = len(reader.pages)
+            for i in range(min(total, max_pages) if max_pages else total):
+                try:
+                    yield reader.pages[i].extract_text() or ""
+                except Exception as e:
+                    failed[i] = f"{type(e).__name__}: {e}"[:500]
+                    yield ""
+            return
+        with _as_path(src if isinstance(src, (str, Path)) else f) as path:
+            yield from extract_pdf_pages(path, max_pages, failed)
 
 
 def extract_text_from_docx(src: FileLike) -> str:
-    bio = _ensure_bytesio(src)
-    doc = DocxDocument(bio)
-    paras = [p.text for p in doc.paragraphs if p.text]
+    if not HAS_DOCX:
+        raise RuntimeError("python-docx is not installed")
+    with _open_seekable(src) as f:
+        doc = DocxDocument(f)
+        paras = [p.text for p in doc.paragraphs if p.text]
     return "\n".join(paras).strip()
 
 
-def extract_text_auto(src: FileLike, mime: str) -> str:
-    m = (mime or "").lower()
-    if "pdf" in m:
-        return extract_text_from_pdf(src)
-    if "word" in m or m.endswith("officedocument.wordprocessingml.document"):
-        return extract_text_from_docx(src)
-    if isinstance(src, (str, Path)):
-        try:
-            return Path(src).read_text(encoding="utf-8", errors="ignore")
-        except Exception:
-            return ""
+def _read_plain(src: FileLike, max_chars: int) -> str:
     try:
-        return _ensure_bytesio(src).getvalue().decode("utf-8", errors="ignore")
+        with _open_seekable(src) as f:
+            reader = io.TextIOWrapper(f, encoding="utf-8", errors="ignore")  # type: ignore
+            try:
+                return reader.read(max_chars or -1)
+            finally:
+                # leave the caller's handle open
+                reader.detach()
     except Exception:
         return ""
+
+
+# PDFs yield one entry per page, lazily; other formats are a single page. Pages
+# that could not be extracted are recorded in `failed`
+def iter_pages(
+    src: FileLike,
+    mime: str,
+    max_pages: int = MAX_PAGES,
+    max_chars: int = MAX_CHARS,
+    failed: dict[int, str] | None = None,
+) -> Iterator[str]:
+    m = (mime or "").lower()
+    if "pdf" in m:
+        pages = iter_pdf_pages(src, max_pages, failed)
+    elif "word" in m or m.endswith("officedocument.wordprocessingml.document"):
+        pages = iter([extract_text_from_docx(src)])
+    else:
+        pages = iter([_read_plain(src, max_chars)])
+    yield from _capped(pages, max_pages, max_chars)
+
+
+def join_pages(pages: list[str]) -> str:
+    return "\n".join(pages).strip()
+
+
+def extract_pages_auto(src: FileLike, mime: str, failed: dict[int, str] | None = None) -> list[str]:
+    return list(iter_pages(src, mime, failed=failed))
@@ -0,0 +1,134 @@
+import os
+import threading
+from typing import Protocol
+
+from django.conf import settings
+
+# query projections: "documents" is the chunk text, "metadatas" everything else
+INCLUDE_ALL = ("documents", "metadatas")
+
+
+class VectorStore(Protocol):
+    def upsert(self, collection: str, vectors: list[list[float]], payloads: list[dict]): ...
+
+    def query(
+        self,
+        collection: str,
+        qv: list[float],
+        top_k: int,
+        include: tuple[str, ...] = INCLUDE_ALL,
+    ) -> list[tuple[float, dict]]: ...
+
+    def query_many(
+        self,
+        collection: str,
+        qvs: list[list[float]],
+        top_k: int,
+        include: tuple[str, ...] = INCLUDE_ALL,
+    ) -> list[list[tuple[float, dict]]]: ...
+
+    def get_document(
+        self, collection: str, doc_id: str
+    ) -> tuple[list[list[float]], list[dict]]: ...
+
+    def delete_document(self, collection: str, doc_id: str): ...
+
+    def stats(self) -> dict[str, int]: ...
+
+    def delete_all(self): ...
+
+    def count(self, collection: str) -> int: ...
+
+
+class RoutedVectorDB:
+    # Sends collections whose name starts with one of `prefixes` to the small-store
+    # backend and everything else to the large one. A small collection that so far
+    # only exists in the large store (indexed before routing) keeps being served from
+    # there until `manage.py move_small_collections` copies it over.
+    def __init__(self, large, small, prefixes: tuple[str, ...]):
+        self._large_factory = large
+        self._large = None
+        self.small = small
+        self.prefixes = prefixes
+        self._lock = threading.Lock()
+
+    @property
+    def large(self):
+        # Chroma opens its sqlite store on creation; reference-set traffic rarely needs it
+        if self._large is None:
+            with self._lock:
+                if self._large is None:
+                    self._large = self._large_factory()
+        return self._large
+
+    def _route(self, collection: str):
+        if not collection.startswith(self.prefixes):
+            return self.large
+        if self.small.has_collection(collection) or not self.large.has_collection(collection):
+            return self.small
+        return self.large
+
+    def upsert(self, collection: str, vectors: list[list[float]], payloads: list[dict]):
+        self._route(collection).upsert(collection, vectors, payloads)
+
+    def query(
+        self,
+        collection: str,
+        qv: list[float],
+        top_k: int,
+        include: tuple[str, ...] = INCLUDE_ALL,
+    ) -> list[tuple[float, dict]]:
+        return self._route(collection).query(collection, qv, top_k, include=include)
+
+    def query_many(
+        self,
+        collection: str,
+        qvs: list[list[float]],
+        top_k: int,
+        include: tuple[str, ...] = INCLUDE_ALL,
+    ) -> list[list[tuple[float, dict]]]:
+        return self._route(collection).query_many(collection, qvs, top_k, include=include)
+
+    def get_document(self, collection: str, doc_id: str) -> tuple[list[list[float]], list[dict]]:
+        return self._route(collection).get_document(collection, doc_id)
+
+    def delete_document(self, collection: str, doc_id: str):
+        self._route(collection).delete_document(collection, doc_id)
+
+    def stats(self) -> dict[str, int]:
+        return {**self.large.stats(), **self.small.stats()}
+
+    def delete_all(self):
+        self.large.delete_all()
+        self.small.delete_all()
+
+    def count(self, collection: str) -> int:
+        return self._route(collection).count(collection)
+
+
+def chroma_store():
+    from .vectordb_chroma import ChromaVectorDB
+
+    return ChromaVectorDB(persist_dir=str(settings.VDB_DIR))
+
+
+def numpy_store():
+    from .vectordb_numpy import NumpyVectorDB
+
+    return NumpyVectorDB(root=str(settings.NUMPY_VDB_DIR))
+
+
+def small_prefixes() -> tuple[str, ...]:
+    raw = os.getenv("VECTOR_STORE_SMALL_PREFIXES", "refset_")
+    return tuple(p.strip() for p in raw.split(",") if p.strip())
+
+
+# VECTOR_STORE=chroma (default) | numpy | routed: routed keeps the large
+# "references" corpus in Chroma and reference-set collections in NumPy
+def build_vector_store() -> VectorStore:
+    backend = os.getenv("VECTOR_STORE", "chroma").lower()
+    if backend == "numpy":
+        return numpy_store()
+    if backend == "routed":
+        return RoutedVectorDB(large=chroma_store, small=numpy_store(), prefixes=small_prefixes())
+    return chroma_store()
@@ -1,11 +1,93 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
 from chromadb import PersistentClient
 from chromadb.config import Settings
 
+from .vectordb import INCLUDE_ALL
+
+try:
+    import fcntl
+
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+
+class _Counters:
+    # per-collection record counts kept next to the Chroma store and updated by
+    # every write, so counts and stats never have to open a collection. The file
+    # lock also serializes writers across processes, which keeps the deltas exact.
+    def __init__(self, path: Path, seed):
+        self.path = path
+        self.seed = seed
+        self._counts: dict[str, int] = {}
+        self._stamp: tuple[int, int] | None = None
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict[str, int]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            with self.update():
+                pass
+            st = self.path.stat()
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp != self._stamp:
+            with open(self.path, encoding="utf-8") as f:
+                self._counts = json.load(f)
+            self._stamp = stamp
+        return self._counts
+
+    def get(self, collection: str) -> int:
+        return self._read().get(collection, 0)
+
+    def has(self, collection: str) -> bool:
+        return collection in self._read()
+
+    def all(self) -> dict[str, int]:
+        return dict(self._read())
+
+    @contextmanager
+    def update(self):
+        with self._lock, open(self.path.with_suffix(".lock"), "a") as lock:
+            if HAS_FCNTL:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        counts = json.load(f)
+                except FileNotFoundError:
+                    # first use on an existing store: count every collection once
+                    counts = self.seed()
+                yield counts
+                fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".json")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(counts, f)
+                os.replace(tmp, self.path)
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
 
 class ChromaVectorDB:
     def __init__(self, persist_dir: str):
         self.client = PersistentClient(path=persist_dir, settings=Settings())
         self._cols: dict[str, object] = {}
+        self.counters = _Counters(Path(persist_dir) / "collection_counts.json", self._count_all)
+
+    def _count_all(self) -> dict[str, int]:
+        counts: dict[str, int] = {}
+        for c in self.client.list_collections():
+            try:
+                counts[c.name] = c.count()  # type: ignore[attr-defined]
+            except Exception:
+                counts[c.name] = 0
+        return counts
 
     def _get(self, name: str):
         if name not in self._cols:
@@ -14,46 +96,114 @@ class ChromaVectorDB:
             )
         return self._cols[name]
 
+    @staticmethod
+    def _payload(md: dict | None, doc: str | None) -> dict:
+        payload = dict(md or {})
+        # records written before chunk text moved to documents keep it in metadata,
+        # so it only comes back when metadatas are included (reindex to migrate)
+        if doc is not None:
+            payload["text"] = doc
+        return payload
+
     def upsert(self, collection: str, vectors: list[list[float]], payloads: list[dict]):
         col = self._get(collection)
         ids = [p["id"] for p in payloads]
+        documents = [p.get("text") or "" for p in payloads]
         metadatas = [
             {
                 "doc_id": p.get("doc_id"),
                 "offset": int(p.get("offset", 0)),
-                "text": p.get("text"),
                 "ts": p.get("ts"),
                 "storage_path": p.get("storage_path"),
             }
             for p in payloads
         ]
-        col.upsert(embeddings=vectors, metadatas=metadatas, ids=ids)  # type: ignore
+        with self.counters.update() as counts:
+            existing = col.get(ids=ids, include=[])["ids"]  # type: ignore
+            col.upsert(  # type: ignore
+                embeddings=vectors, documents=documents, metadatas=metadatas, ids=ids
+            )
+            counts[collection] = counts.get(collection, 0) + len(set(ids)) - len(existing)
+
+    def query(
+        self,
+        collection: str,
+        qv: list[float],
+        top_k: int,
+        include: tuple[str, ...] = INCLUDE_ALL,
+    ) -> list[tuple[float, dict]]:
+        return self.query_many(collection, [qv], top_k, include=include)[0]
 
-    def query(self, collection: str, qv: list[float], top_k: int) -> list[tuple[float, dict]]:
+    def query_many(
+        self,
+        collection: str,
+        qvs: list[list[float]],
+        top_k: int,
+        include: tuple[str, ...] = INCLUDE_ALL,
+    ) -> list[list[tuple[float, dict]]]:
         col = self._get(collection)
-        res = col.query(query_embeddings=[qv], n_results=top_k)  # type: ignore
+        res = col.query(  # type: ignore
+            query_embeddings=qvs, n_results=top_k, include=[*include, "distances"]
+        )
         out = []
-        if res["ids"] and res["ids"][0]:
-            for i in range(len(res["ids"][0])):
-                md = res["metadatas"][0][i]
-                score = 1.0 - float(res["distances"][0][i])
-                out.append((score, md))
+        for q in range(len(qvs)):
+            hits = []
+            ids = res["ids"][q] if res["ids"] else []
+            for i in range(len(ids)):
+                md = res["metadatas"][q][i] if "metadatas" in include else None
+                doc = res["documents"][q][i] if "documents" in include else None
+                score = 1.0 - float(res["distances"][q][i])
+                hits.append((score, self._payload(md, doc)))
+            out.append(hits)
         return out
 
-    def stats(self) -> dict[str, int]:
-        stats: dict[str, int] = {}
-        for c in self.client.list_collections():
+    def _get_all(self, collection: str, **where) -> tuple[list[list[float]], list[dict]]:
+        res = self._get(collection).get(  # type: ignore
+            include=["embeddings", "metadatas", "documents"], **where
+        )
+        payloads = [
+            {"id": i, **self._payload(md, doc)}
+            for i, md, doc in zip(res["ids"], res["metadatas"], res["documents"], strict=True)
+        ]
+        return [list(v) for v in res["embeddings"]], payloads
+
+    def get_document(self, collection: str, doc_id: str) -> tuple[list[list[float]], list[dict]]:
+        return self._get_all(collection, where={"doc_id": str(doc_id)})
+
+    def export(self, collection: str) -> tuple[list[list[float]], list[dict]]:
+        if collection not in {c.name for c in self.client.list_collections()}:
+            return [], []
+        return self._get_all(collection)
+
+    def drop(self, collection: str):
+        self._cols.pop(collection, None)
+        with self.counters.update() as counts:
             try:
-                stats[c.name] = c.count()  # type: ignore[attr-defined]
+                self.client.delete_collection(collection)
             except Exception:
-                stats[c.name] = 0
-        return stats
+                pass
+            counts.pop(collection, None)
+
+    def delete_document(self, collection: str, doc_id: str):
+        col = self._get(collection)
+        with self.counters.update() as counts:
+            ids = col.get(where={"doc_id": str(doc_id)}, include=[])["ids"]  # type: ignore
+            if ids:
+                col.delete(ids=ids)  # type: ignore
+                counts[collection] = max(0, counts.get(collection, 0) - len(ids))
+
+    def stats(self) -> dict[str, int]:
+        return self.counters.all()
 
     def delete_all(self):
-        for c in list(self.client.list_collections()):
-            self.client.delete_collection(c.name)
+        with self.counters.update() as counts:
+            for c in list(self.client.list_collections()):
+                self.client.delete_collection(c.name)
+            counts.clear()
         self._cols.clear()
 
+    def has_collection(self, collection: str) -> bool:
+        return self.counters.has(collection)
+
     def count(self, collection: str) -> int:
-        col = self.client.get_or_create_collection(collection)
-        return col.count()
+        return self.counters.get(collection)
@@ -0,0 +1,222 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from .vectordb import INCLUDE_ALL
+
+try:
+    import fcntl
+
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+_SAFE = re.compile(r"[^a-zA-Z0-9._-]")
+
+
+class _Matrix:
+    __slots__ = ("vectors", "payloads", "stamp")
+
+    def __init__(self, vectors: np.ndarray, payloads: list[dict], stamp: tuple[int, int]):
+        self.vectors = vectors
+        self.payloads = payloads
+        self.stamp = stamp
+
+
+class NumpyVectorDB:
+    # Exact cosine search over one normalized float32 matrix per collection, for
+    # collections small enough that a single matrix-vector product beats an index.
+    # Each collection is <name>.npy (memory-mapped) plus <name>.json payloads; writers
+    # replace both files atomically under a file lock and readers reload when the
+    # payload file changes.
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._cache: dict[str, _Matrix] = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, collection: str) -> tuple[Path, Path]:
+        name = _SAFE.sub("_", collection)
+        return self.root / f"{name}.npy", self.root / f"{name}.json"
+
+    @contextmanager
+    def _write_lock(self, collection: str):
+        vec_path, _ = self._paths(collection)
+        with self._lock, open(vec_path.with_suffix(".lock"), "a") as lock:
+            if HAS_FCNTL:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _stamp(path: Path) -> tuple[int, int]:
+        # every write renames a new file into place, so the inode changes even when
+        # two writes land within the filesystem's mtime resolution
+        st = path.stat()
+        return st.st_ino, st.st_mtime_ns
+
+    def _load(self, collection: str) -> _Matrix | None:
+        vec_path, meta_path = self._paths(collection)
+        try:
+            stamp = self._stamp(meta_path)
+            cached = self._cache.get(collection)
+            if cached is not None and cached.stamp == stamp:
+                return cached
+            # vectors are replaced before payloads, so a row-count mismatch means a
+            # writer is between the two renames; re-read until they agree
+            for _ in range(5):
+                with open(meta_path, encoding="utf-8") as f:
+                    payloads = json.load(f)
+                vectors = np.load(vec_path, mmap_mode="r")
+                if len(vectors) == len(payloads):
+                    break
+                stamp = self._stamp(meta_path)
+        except FileNotFoundError:
+            self._cache.pop(collection, None)
+            return None
+        matrix = _Matrix(vectors, payloads, stamp)
+        self._cache[collection] = matrix
+        return matrix
+
+    def _replace(self, path: Path, write):
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=path.suffix)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _save(self, collection: str, vectors: np.ndarray, payloads: list[dict]):
+        vec_path, meta_path = self._paths(collection)
+        if not payloads:
+            for p in (meta_path, vec_path):
+                if p.exists():
+                    p.unlink()
+            self._cache.pop(collection, None)
+            return
+        self._replace(vec_path, lambda f: np.save(f, vectors))
+        body = json.dumps(payloads, ensure_ascii=False).encode("utf-8")
+        self._replace(meta_path, lambda f: f.write(body))
+        self._cache.pop(collection, None)
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        m = np.asarray(vectors, dtype=np.float32)
+        if m.ndim == 1:
+            m = m[None, :]
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return m / norms
+
+    def upsert(self, collection: str, vectors: list[list[float]], payloads: list[dict]):
+        if not payloads:
+            return
+        new = self._normalize(vectors)
+        with self._write_lock(collection):
+            current = self._load(collection)
+            incoming = {p["id"] for p in payloads}
+            if current is None:
+                keep_vectors, keep_payloads = new[:0], []
+            else:
+                keep = [i for i, p in enumerate(current.payloads) if p["id"] not in incoming]
+                keep_vectors = np.asarray(current.vectors[keep], dtype=np.float32)
+                keep_payloads = [current.payloads[i] for i in keep]
+            self._save(
+                collection,
+                np.concatenate([keep_vectors, new]) if len(keep_vectors) else new,
+                keep_payloads + [dict(p) for p in payloads],
+            )
+
+    def query(
+        self,
+        collection: str,
+        qv: list[float],
+        top_k: int,
+        include: tuple[str, ...] = INCLUDE_ALL,
+    ) -> list[tuple[float, dict]]:
+        return self.query_many(collection, [qv], top_k, include=include)[0]
+
+    @staticmethod
+    def _project(payload: dict, include: tuple[str, ...]) -> dict:
+        if "metadatas" not in include:
+            return {"text": payload.get("text", "")} if "documents" in include else {}
+        if "documents" not in include:
+            return {k: v for k, v in payload.items() if k != "text"}
+        return payload
+
+    def query_many(
+        self,
+        collection: str,
+        qvs: list[list[float]],
+        top_k: int,
+        include: tuple[str, ...] = INCLUDE_ALL,
+    ) -> list[list[tuple[float, dict]]]:
+        matrix = self._load(collection)
+        if matrix is None or not matrix.payloads or top_k <= 0:
+            return [[] for _ in qvs]
+        # one (rows x queries) product scores every query at once
+        scores = matrix.vectors @ self._normalize(qvs).T
+        k = min(top_k, len(matrix.payloads))
+        out = []
+        for col in scores.T:
+            top = np.argpartition(-col, k - 1)[:k]
+            top = top[np.argsort(-col[top])]
+            out.append([(float(col[i]), self._project(matrix.payloads[i], include)) for i in top])
+        return out
+
+    def get_document(self, collection: str, doc_id: str) -> tuple[list[list[float]], list[dict]]:
+        matrix = self._load(collection)
+        if matrix is None:
+            return [], []
+        rows = [i for i, p in enumerate(matrix.payloads) if p.get("doc_id") == str(doc_id)]
+        return (
+            [matrix.vectors[i].tolist() for i in rows],
+            [dict(matrix.payloads[i]) for i in rows],
+        )
+
+    def delete_document(self, collection: str, doc_id: str):
+        with self._write_lock(collection):
+            current = self._load(collection)
+            if current is None:
+                return
+            keep = [i for i, p in enumerate(current.payloads) if p.get("doc_id") != str(doc_id)]
+            if len(keep) == len(current.payloads):
+                return
+            self._save(
+                collection,
+                np.asarray(current.vectors[keep], dtype=np.float32),
+                [current.payloads[i] for i in keep],
+            )
+
+    def has_collection(self, collection: str) -> bool:
+        return self._paths(collection)[1].exists()
+
+    def collections(self) -> list[str]:
+        return [meta_path.stem for meta_path in self.root.glob("*.json")]
+
+    def stats(self) -> dict[str, int]:
+        return {name: self.count(name) for name in self.collections()}
+
+    def delete_all(self):
+        for path in self.root.iterdir():
+            if path.suffix in (".npy", ".json", ".lock"):
+                path.unlink()
+        self._cache.clear()
+
+    def count(self, collection: str) -> int:
+        matrix = self._load(collection)
+        return len(matrix.payloads) if matrix is not None else 0
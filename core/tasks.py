@@ -1,120 +1,447 @@
-import logging
 import os
+import time
+from collections import deque
+from contextlib import contextmanager
 
-from celery import shared_task
-from django.conf import settings
-from django.core.files.storage import default_storage
+from celery import chain, chord, shared_task
+from celery.exceptions import Retry
 from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 
-from .models import Evaluation, Job, JobStageLog
+from .models import Document, Evaluation, EvaluationBatch, Job, JobStageLog, ReindexJob
 from .services.collections import ref_collection
-from .services.evaluation import run_evaluation
+from .services.document_text import IncompleteExtraction, describe_failures, get_document_text
+from .services.evaluation import evaluate_cv, evaluate_project, prompt_vars, synthesize
+from .services.indexing import (
+    BulkIndexer,
+    alias_document,
+    index_document,
+    reference_index_state,
+)
+from .services.llm_client import RETRYABLE_ERRORS
+from .services.rag import fetch_job_context, invalidate_reference_context
 from .services.retrieval import retrieval
-from .services.text_extractor import extract_text_auto
 
+# evaluation waits this long for freshly uploaded reference documents to be indexed
+INDEX_WAIT_COUNTDOWN = max(1, int(os.getenv("EVAL_INDEX_WAIT_COUNTDOWN", "2")))
+INDEX_WAIT_POLLS = int(os.getenv("EVAL_INDEX_WAIT_SECONDS", "120")) // INDEX_WAIT_COUNTDOWN
 
-@shared_task(
-    bind=True, max_retries=3, autoretry_for=(TimeoutError, ConnectionError), retry_backoff=True
-)
-def evaluate_job_task(self, job_id: str):
-    with transaction.atomic():
-        job = (
-            Job.objects.select_for_update()
-            .select_related("cv_document", "report_document", "reference_set")
-            .get(id=job_id)
-        )
-        job.status = "processing"
-        job.attempts = (job.attempts or 0) + 1
-        job.started_at = timezone.now()
-        job.save(update_fields=["status", "attempts", "started_at"])
-
-        cid_jd = ref_collection(str(job.reference_set.id), "job_desc")  # type: ignore
-        cid_rub = ref_collection(str(job.reference_set.id), "scoring_rubric")  # type: ignore
-        cid_cb = ref_collection(str(job.reference_set.id), "case_brief")  # type: ignore
-
-        logger = logging.getLogger(__name__)
-        logger.warning(
-            "[BOOT] VDB_DIR=%s exists=%s list=%s",
-            settings.VDB_DIR,
-            os.path.exists(settings.VDB_DIR),
-            os.listdir(settings.VDB_DIR) if os.path.exists(settings.VDB_DIR) else None,
-        )
+# pages that timed out or crashed a worker under load usually extract on a retry
+INDEX_RETRYABLE = (TimeoutError, ConnectionError, IncompleteExtraction)
 
-        logger.warning(
-            "[CHK] counts jd=%s rub=%s cb=%s",
-            retrieval.count(cid_jd),
-            retrieval.count(cid_rub),
-            retrieval.count(cid_cb),
+LLM_RETRYABLE = (TimeoutError, ConnectionError, *RETRYABLE_ERRORS)
+
+
+@shared_task(bind=True, max_retries=3, autoretry_for=INDEX_RETRYABLE, retry_backoff=True)
+def index_document_task(
+    self,
+    document_id: str,
+    collection: str,
+    source_id: str | None = None,
+    source_collection: str | None = None,
+):
+    doc = Document.objects.get(id=document_id)
+    Document.objects.filter(id=doc.id).update(index_status="indexing", index_error="")
+    try:
+        if source_id:
+            source = Document.objects.get(id=source_id)
+            count = alias_document(doc, collection, source, source_collection)  # type: ignore
+        else:
+            count = index_document(doc, collection)
+    except INDEX_RETRYABLE as e:
+        final = self.request.retries >= self.max_retries
+        Document.objects.filter(id=doc.id).update(
+            index_status="failed" if final else "pending", index_error=str(e)[:2000]
         )
+        raise
+    except Exception as e:
+        Document.objects.filter(id=doc.id).update(index_status="failed", index_error=str(e)[:2000])
+        raise
+
+    # a document without text is ready with no chunks: re-uploading it cannot help, and
+    # evaluation reports the empty reference type through its *_missing warnings
+    Document.objects.filter(id=doc.id).update(
+        index_status="ready",
+        index_error="" if count else "no text could be extracted from the document",
+    )
+    if doc.ref_set_id:  # type: ignore
+        invalidate_reference_context(str(doc.ref_set_id))  # type: ignore
+
+
+# re-enqueues the task with a countdown while reference documents are still being
+# indexed; unlike task.retry this does not use up the retries meant for transient
+# errors. Returns True when the caller should stop and wait for the next poll
+def _wait_for_reference_index(task, refset_id: str, waited: int, *args) -> bool:
+    if waited >= INDEX_WAIT_POLLS or not reference_index_state(refset_id)["pending"]:
+        return False
+    task.apply_async(args=args, kwargs={"waited": waited + 1}, countdown=INDEX_WAIT_COUNTDOWN)
+    return True
+
+
+def _close_batch(batch_id):
+    # a batch is done once none of its jobs is still queued or processing; every job
+    # checks after its own final write, so the last one to finish closes the batch
+    if Job.objects.filter(batch_id=batch_id, status__in=("queued", "processing")).exists():
+        return
+    EvaluationBatch.objects.filter(id=batch_id).exclude(status="completed").update(
+        status="completed", completed_at=timezone.now()
+    )
 
-    JobStageLog.objects.create(job=job, stage="parse_cv", status="started")
-    JobStageLog.objects.create(job=job, stage="parse_report", status="started")
 
-    def _summarize(txt: str, limit: int = 4000) -> str:
-        txt = (txt or "").strip()
-        return txt[:limit]
+def _finish_batch(job_id: str):
+    batch_id = Job.objects.values_list("batch_id", flat=True).get(id=job_id)
+    if batch_id is not None:
+        _close_batch(batch_id)
 
-    with default_storage.open(job.cv_document.storage_path, "rb") as fcv:
-        cv_text = extract_text_auto(fcv, job.cv_document.mime_type)  # type: ignore
-    with default_storage.open(job.report_document.storage_path, "rb") as frp:
-        report_text = extract_text_auto(frp, job.report_document.mime_type)  # type: ignore
 
-    cv_hints = _summarize(cv_text, 4000)
-    report_hints = _summarize(report_text, 4000)
+def _fail_job(job_id: str, error: Exception):
+    Job.objects.filter(id=job_id).update(
+        status="failed", error_message=str(error), completed_at=timezone.now()
+    )
+    _finish_batch(job_id)
 
+
+def _fail_batch(batch_id: str, error: Exception):
+    Job.objects.filter(batch_id=batch_id, status="queued").update(
+        status="failed", error_message=str(error), completed_at=timezone.now()
+    )
+    _close_batch(batch_id)
+
+
+@contextmanager
+def _on_final_failure(task, fail):
+    # wraps a whole task body: once an error will not be retried, fail() records it
+    # so no job or batch is left queued or processing
     try:
-        refset_id = str(job.reference_set.id or "")  # type: ignore
-        prior_warn = []
-        if retrieval.count(cid_jd) == 0:
-            prior_warn.append("job_desc_missing")
-        if retrieval.count(cid_rub) == 0:
-            prior_warn.append("scoring_rubric_missing")
-        if retrieval.count(cid_cb) == 0:
-            prior_warn.append("case_brief_missing")
-
-        doc_versions = f"cv={job.cv_document.id},report={job.report_document.id},refset={job.reference_set.id}"  # type: ignore
-
-        res = run_evaluation(
+        yield
+    except Retry:
+        raise
+    except Exception as e:
+        retrying = isinstance(e, getattr(task, "autoretry_for", ()))
+        if not retrying or task.request.retries >= task.max_retries:
+            fail(e)
+        raise
+
+
+@contextmanager
+def _stage(job_id: str, stage: str):
+    entry = JobStageLog.objects.create(job_id=job_id, stage=stage, status="started")
+    details: dict = {}
+    try:
+        yield details
+    except Exception as e:
+        JobStageLog.objects.filter(id=entry.id).update(
+            status="failed", details={"error": str(e)[:2000]}, ended_at=timezone.now()
+        )
+        raise
+    JobStageLog.objects.filter(id=entry.id).update(
+        status="success", details=details or None, ended_at=timezone.now()
+    )
+
+
+def _summarize(txt: str, limit: int = 4000) -> str:
+    txt = (txt or "").strip()
+    return txt[:limit]
+
+
+# Each stage receives the job state built so far and returns it extended, so a
+# retry only repeats its own stage. Stage results travel as plain JSON.
+def _parse(task, job_id: str, stage: str, doc: Document) -> str:
+    with _stage(job_id, stage) as details:
+        failed: dict[int, str] = {}
+        text = get_document_text(doc, failed)
+        if failed:
+            if task.request.retries < task.max_retries:
+                raise IncompleteExtraction(describe_failures(failed))
+            # out of retries: evaluate what could be read and say what was missing
+            details["failed_pages"] = sorted(i + 1 for i in failed)
+    return text
+
+
+@shared_task(
+    bind=True, max_retries=3, autoretry_for=(OSError, IncompleteExtraction), retry_backoff=True
+)
+def parse_documents_task(self, job_id: str) -> dict:
+    with _on_final_failure(self, lambda e: _fail_job(job_id, e)):
+        job = Job.objects.select_related("cv_document", "report_document").get(id=job_id)
+        cv_text = _parse(self, job_id, "parse_cv", job.cv_document)  # type: ignore
+        report_text = _parse(self, job_id, "parse_report", job.report_document)  # type: ignore
+    return {
+        "job_id": job_id,
+        "cv_hints": _summarize(cv_text, 4000),
+        "report_hints": _summarize(report_text, 4000),
+    }
+
+
+@shared_task(
+    bind=True, max_retries=5, autoretry_for=(TimeoutError, ConnectionError), retry_backoff=True
+)
+def retrieve_context_task(self, state: dict) -> dict:
+    job_id = state["job_id"]
+    with (
+        _on_final_failure(self, lambda e: _fail_job(job_id, e)),
+        _stage(job_id, "retrieve") as details,
+    ):
+        job = Job.objects.select_related("batch").get(id=job_id)
+        refset_id = str(job.reference_set_id or "")  # type: ignore
+        counts = {
+            dtype: retrieval.count(ref_collection(refset_id, dtype))
+            for dtype in ("job_desc", "scoring_rubric", "case_brief")
+        }
+        prior_warn = [f"{dtype}_missing" for dtype, n in counts.items() if n == 0]
+        details["counts"] = counts
+
+        # batches fetch the reference context once for every job
+        context = job.batch.context if job.batch else None  # type: ignore
+        if context is None:
+            context = fetch_job_context(job.job_title, refset_id)
+
+        doc_versions = f"cv={job.cv_document_id},report={job.report_document_id},refset={refset_id}"  # type: ignore
+        state["vars"] = prompt_vars(
             job.job_title,
-            cv_hints,
-            report_hints,
-            refset_id,
-            job_id=str(job.id),
+            state["cv_hints"],
+            state["report_hints"],
+            context,
+            job_id=job_id,
             doc_versions=doc_versions,
             prior_warnings=",".join(prior_warn),
         )
+    return state
 
-        JobStageLog.objects.create(job=job, stage="eval_cv", status="success")
-        JobStageLog.objects.create(job=job, stage="eval_project", status="success")
-        JobStageLog.objects.create(
-            job=job,
-            stage="synthesize",
-            status="success",
-            details={"cv_match_rate": res["cv_match_rate"], "project_score": res["project_score"]},
+
+@shared_task(
+    bind=True,
+    max_retries=3,
+    autoretry_for=LLM_RETRYABLE,
+    retry_backoff=True,
+    retry_backoff_max=60,
+)
+def eval_cv_task(self, state: dict) -> dict:
+    job_id = state["job_id"]
+    with (
+        _on_final_failure(self, lambda e: _fail_job(job_id, e)),
+        _stage(job_id, "eval_cv") as details,
+    ):
+        cv = evaluate_cv(state["vars"])
+        details["llm"] = cv["meta"]
+    return {**state, "cv": cv}
+
+
+@shared_task(
+    bind=True,
+    max_retries=3,
+    autoretry_for=LLM_RETRYABLE,
+    retry_backoff=True,
+    retry_backoff_max=60,
+)
+def eval_project_task(self, state: dict) -> dict:
+    job_id = state["job_id"]
+    with (
+        _on_final_failure(self, lambda e: _fail_job(job_id, e)),
+        _stage(job_id, "eval_project") as details,
+    ):
+        project = evaluate_project(state["vars"], state["report_hints"])
+        details["llm"] = project["meta"]
+    return {**state, "project": project}
+
+
+@shared_task(
+    bind=True,
+    max_retries=3,
+    autoretry_for=LLM_RETRYABLE,
+    retry_backoff=True,
+    retry_backoff_max=60,
+)
+def synthesize_task(self, parts: list[dict]):
+    state: dict = {}
+    for part in parts:
+        state.update(part)
+    job_id = state["job_id"]
+    with (
+        _on_final_failure(self, lambda e: _fail_job(job_id, e)),
+        _stage(job_id, "synthesize") as details,
+    ):
+        res = synthesize(state["vars"], state["cv"], state["project"])
+        details.update(
+            cv_match_rate=res["cv_match_rate"],
+            project_score=res["project_score"],
+            llm=res["debug"]["llm"]["final"],
         )
+        with transaction.atomic():
+            Evaluation.objects.update_or_create(
+                job_id=job_id,
+                defaults={
+                    "cv_match_rate": res["cv_match_rate"],
+                    "cv_feedback": res["cv_feedback"],
+                    "project_score": res["project_score"],
+                    "project_feedback": res["project_feedback"],
+                    "overall_summary": res["overall_summary"],
+                    "raw_llm": res.get("raw_llm"),
+                },
+            )
+            Job.objects.filter(id=job_id).update(
+                status="completed", error_message=None, completed_at=timezone.now()
+            )
+    _finish_batch(job_id)
+
+
+# parse -> retrieve -> (eval_cv | eval_project) -> synthesize; CELERY_TASK_ROUTES can
+# send the CPU-bound and the LLM-bound stages to different queues
+def evaluation_pipeline(job_id: str):
+    return chain(
+        parse_documents_task.s(job_id),  # type: ignore
+        retrieve_context_task.s(),  # type: ignore
+        chord([eval_cv_task.s(), eval_project_task.s()], synthesize_task.s()),  # type: ignore
+    )
+
+
+def _start_job(job_id: str):
+    Job.objects.filter(id=job_id).update(
+        status="processing", attempts=F("attempts") + 1, started_at=timezone.now()
+    )
+    try:
+        evaluation_pipeline(job_id).apply_async()
+    except Exception:
+        # nothing was enqueued; leave the job for a retry to start
+        Job.objects.filter(id=job_id, status="processing").update(status="queued")
+        raise
+
+
+@shared_task(
+    bind=True, max_retries=3, autoretry_for=(TimeoutError, ConnectionError), retry_backoff=True
+)
+def evaluate_job_task(self, job_id: str, waited: int = 0):
+    with _on_final_failure(self, lambda e: _fail_job(job_id, e)):
+        refset_id = Job.objects.values_list("reference_set_id", flat=True).get(id=job_id)
+        if _wait_for_reference_index(self, str(refset_id), waited, job_id):
+            return
+        _start_job(job_id)
+
+
+@shared_task(
+    bind=True, max_retries=3, autoretry_for=(TimeoutError, ConnectionError), retry_backoff=True
+)
+def evaluate_batch_task(self, batch_id: str, waited: int = 0):
+    with _on_final_failure(self, lambda e: _fail_batch(batch_id, e)):
+        batch = EvaluationBatch.objects.select_related("reference_set").get(id=batch_id)
+        refset_id = str(batch.reference_set.id)  # type: ignore
+        if _wait_for_reference_index(self, refset_id, waited, batch_id):
+            return
+
+        # every job of the batch shares one reference set and job title, so the RAG
+        # context is retrieved once here instead of once per job
+        batch.context = fetch_job_context(batch.job_title, refset_id)
+        batch.status = "processing"
+        batch.save(update_fields=["context", "status"])
+
+        # only jobs still queued are started, so a retry never starts a job twice;
+        # each job's last stage closes the batch once no job is left running
+        queued = batch.jobs.filter(status="queued")  # type: ignore
+        for job_id in list(queued.values_list("id", flat=True)):
+            _start_job(str(job_id))
+        _close_batch(batch_id)
+
+
+class ReindexCancelled(Exception):
+    pass
+
 
-        Evaluation.objects.update_or_create(
-            job=job,
-            defaults={
-                "cv_match_rate": res["cv_match_rate"],
-                "cv_feedback": res["cv_feedback"],
-                "project_score": res["project_score"],
-                "project_feedback": res["project_feedback"],
-                "overall_summary": res["overall_summary"],
-                "raw_llm": res.get("raw_llm"),
-            },
+REINDEX_COUNTERS = ("reindexed", "unchanged", "skipped", "failed", "removed", "chunks")
+
+# a reindex runs in slices: after REINDEX_SLICE_SECONDS it saves its checkpoint and
+# re-enqueues itself, so large corpora never reach the task time limits below. A
+# running job whose progress has not moved for longer than the hard limit is dead
+# and may be resumed
+REINDEX_SLICE_SECONDS = int(os.getenv("REINDEX_SLICE_SECONDS", "1800"))
+REINDEX_SOFT_TIME_LIMIT = REINDEX_SLICE_SECONDS + 600
+REINDEX_TIME_LIMIT = REINDEX_SOFT_TIME_LIMIT + 120
+
+
+@shared_task(soft_time_limit=REINDEX_SOFT_TIME_LIMIT, time_limit=REINDEX_TIME_LIMIT)
+def reindex_task(reindex_job_id: str):
+    claimed = ReindexJob.objects.filter(id=reindex_job_id, status="queued").update(
+        status="running", started_at=timezone.now(), cancel_requested=False
+    )
+    if not claimed:
+        return
+    rj = ReindexJob.objects.get(id=reindex_job_id)
+
+    docs = Document.objects.order_by("id").only(
+        "id", "storage_path", "mime_type", "sha256_checksum"
+    )
+    if rj.checkpoint:
+        docs = docs.filter(id__gt=rj.checkpoint)
+    base = {f: getattr(rj, f) for f in REINDEX_COUNTERS}
+    base_processed = rj.processed
+    ReindexJob.objects.filter(id=rj.id).update(total=base_processed + docs.count())
+
+    # the checkpoint only advances past a document once it and every document
+    # before it has finished, since extraction completes out of order
+    issued: deque[str] = deque()
+    finished: set[str] = set()
+    state = {"checkpoint": rj.checkpoint, "saved_at": 0.0, "stats": {}, "sliced": False}
+    started = time.monotonic()
+
+    def ordered_docs():
+        for d in docs.iterator():
+            # stop issuing once the slice is used up; documents in flight still finish
+            if issued and time.monotonic() - started >= REINDEX_SLICE_SECONDS:
+                state["sliced"] = True
+                return
+            issued.append(str(d.id))
+            yield d
+
+    def on_document(doc_id: str, outcome: str):
+        finished.add(doc_id)
+        while issued and issued[0] in finished:
+            state["checkpoint"] = issued.popleft()
+            finished.discard(state["checkpoint"])
+
+    def save(stats: dict, **extra):
+        processed = sum(stats.get(k, 0) for k in ("reindexed", "unchanged", "skipped", "failed"))
+        elapsed = stats.get("elapsed") or 0.0
+        ReindexJob.objects.filter(id=rj.id).update(
+            processed=base_processed + processed,
+            docs_per_sec=round(processed / elapsed, 3) if elapsed else 0.0,
+            checkpoint=state["checkpoint"],
+            updated_at=timezone.now(),
+            **{f: base[f] + stats.get(f, 0) for f in REINDEX_COUNTERS},
+            **extra,
         )
-        job.status = "completed"
-        job.completed_at = timezone.now()
-        job.save(update_fields=["status", "completed_at"])
 
+    def progress(stats: dict):
+        state["stats"] = stats
+        now = time.monotonic()
+        if now - state["saved_at"] < 1.0:
+            return
+        state["saved_at"] = now
+        save(stats)
+        if ReindexJob.objects.filter(id=rj.id, cancel_requested=True).exists():
+            raise ReindexCancelled()
+
+    indexer = BulkIndexer(rj.collection, force=rj.force, progress=progress, on_document=on_document)
+    try:
+        stats = indexer.run(ordered_docs())
+    except ReindexCancelled:
+        save(state["stats"], status="cancelled", errors=(rj.errors + indexer.errors)[:50])
+        return
     except Exception as e:
-        JobStageLog.objects.create(
-            job=job, stage="synthesize", status="failed", details={"error": str(e)}
+        save(
+            state["stats"],
+            status="failed",
+            error_message=str(e)[:2000],
+            errors=(rj.errors + indexer.errors)[:50],
+            completed_at=timezone.now(),
         )
-        job.status = "failed"
-        job.error_message = str(e)
-        job.completed_at = timezone.now()
-        job.save(update_fields=["status", "error_message", "completed_at"])
         raise
+    if state["sliced"]:
+        save(stats, status="queued", errors=(rj.errors + stats["errors"])[:50])
+        reindex_task.delay(str(rj.id))  # type: ignore
+        return
+    save(
+        stats,
+        status="completed",
+        errors=(rj.errors + stats["errors"])[:50],
+        completed_at=timezone.now(),
+    )
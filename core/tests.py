@@ -0,0 +1,79 @@
+import time
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, TestCase
+
+from .models import Document, Job
+from .services import evaluation
+from .services.cache import LocalLRUCache
+from .services.chunker import iter_chunks
+from .services.evaluation import evaluate_cv, prompt_vars
+from .services.llm_client import LLMClient
+from .tasks import eval_cv_task
+
+
+class EvalStageRetryTests(TestCase):
+    def setUp(self):
+        cv = Document.objects.create(type="cv", filename="cv.pdf")
+        report = Document.objects.create(type="report", filename="report.pdf")
+        self.job = Job.objects.create(
+            cv_document=cv, report_document=report, job_title="Backend", status="processing"
+        )
+
+    def test_read_timeout_is_retried_until_exhausted(self):
+        state = {
+            "job_id": str(self.job.id),
+            "vars": prompt_vars("Backend", "cv", "report", {}, job_id=str(self.job.id)),
+        }
+        timeout = requests.ReadTimeout("read timed out")
+        with (
+            mock.patch.dict("os.environ", {"LLM_HTTP2": "0"}),
+            mock.patch("core.services.llm_client._transport", None),
+            mock.patch.object(requests.Session, "post", side_effect=timeout) as post,
+        ):
+            result = eval_cv_task.apply(args=[state])
+
+        # eager retries run inline, so every attempt hits the stubbed session
+        self.assertEqual(post.call_count, eval_cv_task.max_retries + 1)
+        self.assertIsInstance(result.result, requests.ReadTimeout)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "failed")
+
+
+class LLMCacheTests(SimpleTestCase):
+    def setUp(self):
+        client = LLMClient()
+        client.cache = LocalLRUCache()
+        patcher = mock.patch.object(evaluation, "llm", client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _vars(self, job_id: str) -> dict:
+        return prompt_vars("Backend", "cv", "report", {}, job_id=job_id, doc_versions=job_id)
+
+    def test_jobs_with_identical_inputs_share_an_entry(self):
+        answer = {"cv_match_rate": 0.5, "cv_feedback": "ok"}
+        with mock.patch.object(LLMClient, "_request_json", return_value=answer) as request:
+            evaluate_cv(self._vars("job-1"))
+            second = evaluate_cv(self._vars("job-2"))
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(second["meta"]["cache"], "hit")
+
+    def test_rejected_answer_is_not_cached(self):
+        answer = {"cv_match_rate": "n/a", "cv_feedback": "ok"}
+        with mock.patch.object(LLMClient, "_request_json", return_value=answer) as request:
+            for _ in range(2):
+                with self.assertRaises(ValueError):
+                    evaluate_cv(self._vars("job-1"))
+        self.assertEqual(request.call_count, 2)
+
+
+class ChunkerTests(SimpleTestCase):
+    def test_long_whitespace_run_is_linear(self):
+        text = "first part" + " " * 200_000 + "second part.\nnext line"
+        started = time.monotonic()
+        chunks = list(iter_chunks(text))
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(len(chunks), 1)
+        self.assertTrue(chunks[0]["text"].endswith("next line"))
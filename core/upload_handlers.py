@@ -0,0 +1,22 @@
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+# Hashes uploads while Django streams the request body, so the checksum costs no
+# extra read of the spooled file. Runs first in FILE_UPLOAD_HANDLERS and passes
+# every chunk on to the memory/temp-file handlers unchanged.
+class HashingUploadHandler(FileUploadHandler):
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.sha = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, "upload_checksums"):
+            self.request.upload_checksums = {}
+        self.request.upload_checksums[self.field_name] = self.sha.hexdigest()
+        return None
@@ -1,20 +1,41 @@
 from django.urls import path
 
-from .views import JobDetailView, UploadBothView
-from .views_eval import EvaluateNowView
+from .views import DocumentStatusView, JobDetailView, UploadBothView
+from .views_eval import BatchEvaluateView, BatchStatusView, EvaluateNowView
 from .views_reference import UploadReferenceView
 from .views_reference_set import ReferenceSetView
 from .views_result import ResultView
-from .views_retrieve import IndexStatsView, ReindexAllView, RetrieveView
+from .views_retrieve import (
+    IndexStatsView,
+    ReindexAllView,
+    ReindexCancelView,
+    ReindexResumeView,
+    ReindexStatusView,
+    RetrieveView,
+)
 
 urlpatterns = [
     path("upload/", UploadBothView.as_view(), name="upload-both"),
     path("upload-reference/", UploadReferenceView.as_view(), name="upload-reference"),
+    path("document/<uuid:document_id>", DocumentStatusView.as_view(), name="document-status"),
     path("evaluate", EvaluateNowView.as_view(), name="evaluate"),
+    path("evaluate/batch", BatchEvaluateView.as_view(), name="evaluate-batch"),
+    path("batch/<uuid:batch_id>", BatchStatusView.as_view(), name="batch-status"),
     path("result/<uuid:job_id>", ResultView.as_view(), name="result"),
     path("retrieve", RetrieveView.as_view(), name="retrieve"),
     path("reference-set", ReferenceSetView.as_view()),
     path("debug/index-stats", IndexStatsView.as_view(), name="index-stats"),
     path("debug/reindex-all", ReindexAllView.as_view(), name="reindex-all"),
+    path("debug/reindex/<uuid:reindex_id>", ReindexStatusView.as_view(), name="reindex-status"),
+    path(
+        "debug/reindex/<uuid:reindex_id>/cancel",
+        ReindexCancelView.as_view(),
+        name="reindex-cancel",
+    ),
+    path(
+        "debug/reindex/<uuid:reindex_id>/resume",
+        ReindexResumeView.as_view(),
+        name="reindex-resume",
+    ),
     path("jobs/<uuid:job_id>", JobDetailView.as_view()),
 ]
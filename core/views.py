@@ -1,4 +1,5 @@
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import status
@@ -6,53 +7,53 @@ from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Job
+from .models import Document, Job
 from .serializers import UploadSerializer
-from .services.retrieval import retrieval  # type: ignore
+from .tasks import index_document_task
 
 
 class UploadBothView(APIView):
     parser_classes = [MultiPartParser, FormParser]
 
     def post(self, request):
-        ser = UploadSerializer(data=request.data)
+        ser = UploadSerializer(data=request.data, context={"request": request})
         if not ser.is_valid():
             return Response(ser.errors, status=400)
 
         cv_file = request.FILES["cv"]
         report_file = request.FILES["report"]
 
-        cv_doc = ser._save_doc(cv_file, "cv")  # pyright: ignore[reportAttributeAccessIssue]
-        report_doc = ser._save_doc(  # pyright: ignore[reportAttributeAccessIssue]
+        cv_doc, cv_created = ser._save_doc(  # pyright: ignore[reportAttributeAccessIssue]
+            cv_file, "cv"
+        )
+        report_doc, report_created = ser._save_doc(  # pyright: ignore[reportAttributeAccessIssue]
             report_file, "report"
         )
 
         today = timezone.now().strftime("%Y/%m/%d")
-        cv_path = default_storage.save(f"uploads/{today}/{cv_doc.id}_{cv_file.name}", cv_file)
-        report_path = default_storage.save(
-            f"uploads/{today}/{report_doc.id}_{report_file.name}", report_file
-        )
-
-        cv_doc.storage_path = cv_path
-        report_doc.storage_path = report_path
-        cv_doc.save(update_fields=["storage_path"])
-        report_doc.save(update_fields=["storage_path"])
-
-        retrieval.index_document(
-            collection="references",
-            storage_path=cv_path,
-            mime=cv_doc.mime_type,
-            doc_id=str(cv_doc.id),
-        )
-        retrieval.index_document(
-            collection="references",
-            storage_path=report_path,
-            mime=report_doc.mime_type,
-            doc_id=str(report_doc.id),
-        )
+        for doc, f, created in (
+            (cv_doc, cv_file, cv_created),
+            (report_doc, report_file, report_created),
+        ):
+            if created:
+                doc.storage_path = default_storage.save(f"uploads/{today}/{doc.id}_{f.name}", f)
+                doc.save(update_fields=["storage_path"])
+            elif doc.index_status != "failed":
+                continue
+            # extraction and embedding run on the worker; the request only pays for storage
+            doc.index_status = "pending"
+            doc.save(update_fields=["index_status"])
+            transaction.on_commit(
+                lambda doc_id=str(doc.id): index_document_task.delay(doc_id, "references")
+            )
 
         return Response(
-            {"cv_document_id": str(cv_doc.id), "report_document_id": str(report_doc.id)},
+            {
+                "cv_document_id": str(cv_doc.id),
+                "report_document_id": str(report_doc.id),
+                "deduplicated": {"cv": not cv_created, "report": not report_created},
+                "index_status": {"cv": cv_doc.index_status, "report": report_doc.index_status},
+            },
             status=status.HTTP_201_CREATED,
         )
 
@@ -67,6 +68,10 @@ class JobDetailView(APIView):
             "error_message": job.error_message,
             "started_at": job.started_at,
             "completed_at": job.completed_at,
+            "stages": [
+                {"stage": log.stage, "status": log.status, "details": log.details}
+                for log in job.stage_logs.order_by("started_at")  # type: ignore
+            ],
         }
 
         if job.status == "completed" and getattr(job, "evaluation", None):
@@ -81,3 +86,19 @@ class JobDetailView(APIView):
             }
 
         return Response(data, status=200)
+
+
+class DocumentStatusView(APIView):
+    def get(self, request, document_id):
+        doc = get_object_or_404(Document, id=document_id)
+        return Response(
+            {
+                "id": str(doc.id),
+                "type": doc.type,
+                "filename": doc.filename,
+                "reference_set_id": str(doc.ref_set_id) if doc.ref_set_id else None,  # type: ignore
+                "index_status": doc.index_status,
+                "index_error": doc.index_error,
+            },
+            status=200,
+        )
@@ -1,10 +1,24 @@
+from django.db import transaction
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import IdempotencyKey, Job
-from .serializers import EvaluateSerializer
-from .tasks import evaluate_job_task
+from .models import EvaluationBatch, IdempotencyKey, Job
+from .serializers import BatchEvaluateSerializer, EvaluateSerializer
+from .services.indexing import reference_index_state
+from .tasks import evaluate_batch_task, evaluate_job_task
+
+
+def _index_failed(index_state: dict) -> Response:
+    return Response(
+        {
+            "detail": "Reference documents failed to index; re-upload them before evaluating",
+            "failed_documents": index_state["failed"],
+        },
+        status=status.HTTP_409_CONFLICT,
+    )
 
 
 class EvaluateNowView(APIView):
@@ -22,6 +36,10 @@ class EvaluateNowView(APIView):
                     status=status.HTTP_202_ACCEPTED,
                 )
 
+        index_state = reference_index_state(reference_set_id)
+        if index_state["failed"]:
+            return _index_failed(index_state)
+
         job = Job.objects.create(
             cv_document=ser.validated_data["cv_doc"],  # type: ignore
             report_document=ser.validated_data["report_doc"],  # type: ignore
@@ -33,6 +51,81 @@ class EvaluateNowView(APIView):
         if key:
             IdempotencyKey.objects.create(key=key, job=job)
 
+        # the task waits for pending reference documents before it starts
         evaluate_job_task.delay(str(job.id))  # type: ignore
 
-        return Response({"id": str(job.id), "status": "queued"}, status=status.HTTP_202_ACCEPTED)
+        return Response(
+            {"id": str(job.id), "status": "queued", "waiting_for_index": index_state["pending"]},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class BatchEvaluateView(APIView):
+    def post(self, request):
+        ser = BatchEvaluateSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        data = ser.validated_data
+
+        index_state = reference_index_state(str(data["reference_set_id"]))  # type: ignore
+        if index_state["failed"]:
+            return _index_failed(index_state)
+
+        with transaction.atomic():
+            batch = EvaluationBatch.objects.create(
+                reference_set_id=data["reference_set_id"],  # type: ignore
+                job_title=data["job_title"],  # type: ignore
+            )
+            jobs = Job.objects.bulk_create(
+                [
+                    Job(
+                        cv_document=cv_doc,
+                        report_document=report_doc,
+                        job_title=batch.job_title,
+                        status="queued",
+                        reference_set_id=batch.reference_set_id,  # type: ignore
+                        batch=batch,
+                    )
+                    for cv_doc, report_doc in data["pairs"]  # type: ignore
+                ]
+            )
+            transaction.on_commit(lambda: evaluate_batch_task.delay(str(batch.id)))  # type: ignore
+
+        return Response(
+            {
+                "id": str(batch.id),
+                "status": batch.status,
+                "jobs": [str(j.id) for j in jobs],
+                "waiting_for_index": index_state["pending"],
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class BatchStatusView(APIView):
+    def get(self, request, batch_id):
+        batch = get_object_or_404(EvaluationBatch, id=batch_id)
+        counts = {s: 0 for s, _ in Job.STATUS}
+        for row in batch.jobs.values("status").annotate(n=Count("id")):  # type: ignore
+            counts[row["status"]] = row["n"]
+        total = sum(counts.values())
+
+        batch_status = batch.status
+        if total and counts["queued"] + counts["processing"] == 0:
+            batch_status = "completed"
+
+        return Response(
+            {
+                "id": str(batch.id),
+                "status": batch_status,
+                "job_title": batch.job_title,
+                "reference_set_id": str(batch.reference_set_id),  # type: ignore
+                "total": total,
+                "counts": counts,
+                "created_at": batch.created_at,
+                "completed_at": batch.completed_at,
+                "jobs": [
+                    {"id": str(j["id"]), "status": j["status"]}
+                    for j in batch.jobs.values("id", "status").order_by("created_at")  # type: ignore
+                ],
+            }
+        )
@@ -1,15 +1,17 @@
 import os
 
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .models import Document, ReferenceSet
+from .serializers import find_duplicate, upload_checksum
 from .serializers_reference import UploadReferenceSerializer
 from .services.collections import ref_collection  # type: ignore
-from .services.retrieval import retrieval  # type: ignore
+from .tasks import index_document_task
 
 
 class UploadReferenceView(APIView):
@@ -21,33 +23,63 @@ class UploadReferenceView(APIView):
         ref_set = ReferenceSet.objects.get(id=ser.validated_data["reference_set_id"])  # type: ignore
         dtype = ser.validated_data["type"]  # type: ignore
         f = ser.validated_data["file"]  # type: ignore
+        collection = ref_collection(str(ref_set.id), dtype)
+
+        checksum = upload_checksum(request, "file", f)
+        same_set = find_duplicate(checksum, dtype, ref_set=ref_set)
+        if same_set is not None:
+            if same_set.index_status == "failed":
+                same_set.index_status = "pending"
+                same_set.save(update_fields=["index_status"])
+                transaction.on_commit(
+                    lambda: index_document_task.delay(str(same_set.id), collection)  # type: ignore
+                )
+            return Response(
+                {
+                    "document_id": str(same_set.id),
+                    "reference_set_id": str(ref_set.id),
+                    "collection": collection,
+                    "deduplicated": True,
+                    "index_status": same_set.index_status,
+                },
+                status=status.HTTP_200_OK,
+            )
+        source = find_duplicate(checksum, dtype, ref_set__isnull=False)
 
         doc = Document.objects.create(
             type=dtype,
             ref_set=ref_set,
             filename=f.name,
             mime_type=getattr(f, "content_type", "application/octet-stream"),
-            sha256_checksum="",
-            storage_path="",
+            sha256_checksum=checksum,
+            storage_path=source.storage_path if source else "",
+            index_status="pending",
         )
 
-        today = timezone.now().strftime("%Y/%m/%d")
-        safe_name = os.path.basename(f.name)
-        rel_path = f"uploads/{today}/{doc.id}_{safe_name}"
+        task_args = [str(doc.id), collection]
+        if source is None:
+            today = timezone.now().strftime("%Y/%m/%d")
+            safe_name = os.path.basename(f.name)
+            rel_path = f"uploads/{today}/{doc.id}_{safe_name}"
 
-        storage_path = default_storage.save(rel_path, f)
+            storage_path = default_storage.save(rel_path, f)
 
-        doc.storage_path = storage_path.replace("\\", "/")
-        doc.save(update_fields=["storage_path"])
-
-        collection = ref_collection(str(ref_set.id), dtype)
-        retrieval.index_document(collection, doc.storage_path, doc.mime_type, str(doc.id))
+            doc.storage_path = storage_path.replace("\\", "/")
+            doc.save(update_fields=["storage_path"])
+        else:
+            # same bytes already live in another reference set: alias the storage
+            # object and reuse its extracted text and vectors
+            task_args += [str(source.id), ref_collection(str(source.ref_set_id), dtype)]
+        # the task bumps the reference set's context version once the vectors land
+        transaction.on_commit(lambda: index_document_task.delay(*task_args))  # type: ignore
 
         return Response(
             {
                 "document_id": str(doc.id),
                 "reference_set_id": str(ref_set.id),
                 "collection": collection,
+                "deduplicated": source is not None,
+                "index_status": doc.index_status,
             },
             status=status.HTTP_201_CREATED,
         )
@@ -1,13 +1,17 @@
-from pathlib import Path
+from datetime import timedelta
 
-from django.conf import settings
-from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from core.models import Document
-
+from .models import ReindexJob
 from .services.retrieval import retrieval
+from .services.vectordb import INCLUDE_ALL
+from .tasks import REINDEX_TIME_LIMIT, reindex_task
 
 
 class RetrieveView(APIView):
@@ -19,76 +23,99 @@ class RetrieveView(APIView):
         except Exception:
             top_k = 5
 
-        hits = retrieval.search(collection, q, top_k=top_k) if q else []
+        # include=documents and/or metadatas; large top_k requests can skip metadata
+        fields = (request.query_params.get("include") or "").split(",")
+        include = tuple(f for f in fields if f in INCLUDE_ALL) or INCLUDE_ALL
+
+        hits = retrieval.search(collection, q, top_k=top_k, include=include) if q else []
         return Response({"collection": collection, "query": q, "hits": hits})
 
 
 class IndexStatsView(APIView):
     def get(self, request):
         stats = retrieval.vdb.stats()
-        return Response({"collections": stats})
+        return Response(
+            {"collections": stats, "query_embedding_cache": retrieval.query_cache.stats()}
+        )
+
+
+def _reindex_payload(rj: ReindexJob) -> dict:
+    remaining = max(0, rj.total - rj.processed)
+    eta = None
+    if rj.status == "running" and rj.docs_per_sec > 0:
+        eta = round(remaining / rj.docs_per_sec, 1)
+    return {
+        "id": str(rj.id),
+        "collection": rj.collection,
+        "status": rj.status,
+        "force": rj.force,
+        "total": rj.total,
+        "processed": rj.processed,
+        "reindexed_docs": rj.reindexed,
+        "unchanged_docs": rj.unchanged,
+        "skipped_docs": rj.skipped,
+        "failed_docs": rj.failed,
+        "removed_docs": rj.removed,
+        "chunks": rj.chunks,
+        "docs_per_sec": rj.docs_per_sec,
+        "eta_seconds": eta,
+        "checkpoint": rj.checkpoint,
+        "cancel_requested": rj.cancel_requested,
+        "errors": (rj.errors or [])[:10],
+        "error_message": rj.error_message,
+        "created_at": rj.created_at,
+        "started_at": rj.started_at,
+        "completed_at": rj.completed_at,
+    }
 
 
 class ReindexAllView(APIView):
     def post(self, request):
         collection = request.data.get("collection", "references")
-
-        reindexed_docs = 0
-        skipped_docs = 0
-        failed_docs = 0
-        errors = []
-
-        def _is_file(path_str: str) -> bool:
-            if not path_str:
-                return False
-            try:
-                if default_storage.exists(path_str):
-                    pass
-            except Exception:
-                pass
-
-            p = Path(path_str)
-            if p.is_absolute():
-                return p.is_file()
-
-            local = Path(settings.MEDIA_ROOT) / path_str
-            return local.is_file()
-
-        def _normalize(path_str: str) -> str:
-            return path_str or ""
-
-        for d in Document.objects.all().only("id", "storage_path", "mime_type"):
-            try:
-                sp = _normalize(d.storage_path)
-
-                if not sp or sp.endswith("/") or not _is_file(sp):
-                    skipped_docs += 1
-                    continue
-
-                count_chunks = retrieval.index_document(collection, sp, d.mime_type, str(d.id))
-                if count_chunks > 0:
-                    reindexed_docs += 1
-                else:
-                    skipped_docs += 1
-
-            except Exception as e:
-                failed_docs += 1
-                errors.append(
-                    {
-                        "doc_id": str(d.id),
-                        "storage_path": d.storage_path,
-                        "error": str(e)[:500],
-                    }
-                )
-
-        stats = retrieval.vdb.stats()
-        return Response(
-            {
-                "collection": collection,
-                "reindexed_docs": reindexed_docs,
-                "skipped_docs": skipped_docs,
-                "failed_docs": failed_docs,
-                "errors": errors[:10],
-                "collections": stats,
-            }
+        force = str(request.data.get("force", "")).lower() in ("1", "true", "yes")
+
+        rj = ReindexJob.objects.create(collection=collection, force=force)
+        transaction.on_commit(lambda: reindex_task.delay(str(rj.id)))  # type: ignore
+        return Response(_reindex_payload(rj), status=status.HTTP_202_ACCEPTED)
+
+
+class ReindexStatusView(APIView):
+    def get(self, request, reindex_id):
+        rj = get_object_or_404(ReindexJob, id=reindex_id)
+        return Response(_reindex_payload(rj))
+
+
+class ReindexCancelView(APIView):
+    def post(self, request, reindex_id):
+        rj = get_object_or_404(ReindexJob, id=reindex_id)
+        if rj.status == "queued":
+            # never picked up by a worker; the task skips jobs that are no longer queued
+            ReindexJob.objects.filter(id=rj.id, status="queued").update(
+                status="cancelled", updated_at=timezone.now()
+            )
+        elif rj.status == "running":
+            ReindexJob.objects.filter(id=rj.id).update(cancel_requested=True)
+        rj.refresh_from_db()
+        return Response(_reindex_payload(rj), status=status.HTTP_202_ACCEPTED)
+
+
+class ReindexResumeView(APIView):
+    def post(self, request, reindex_id):
+        rj = get_object_or_404(ReindexJob, id=reindex_id)
+        # a running job whose progress stopped for longer than the task's hard time
+        # limit was killed with its worker and will never finish on its own
+        stale = Q(
+            status="running", updated_at__lt=timezone.now() - timedelta(seconds=REINDEX_TIME_LIMIT)
+        )
+        resumed = (
+            ReindexJob.objects.filter(id=rj.id)
+            .filter(Q(status__in=["cancelled", "failed"]) | stale)
+            .update(status="queued", cancel_requested=False, error_message=None, completed_at=None)
         )
+        if not resumed:
+            return Response(
+                {"detail": f"cannot resume a {rj.status} reindex"}, status=status.HTTP_409_CONFLICT
+            )
+        transaction.on_commit(lambda: reindex_task.delay(str(rj.id)))  # type: ignore
+        rj.refresh_from_db()
+        return Response(_reindex_payload(rj), status=status.HTTP_202_ACCEPTED)